@@ -0,0 +1,244 @@
+import sqlite3
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import archive
+
+# One row per (date, hour, section): the counters below, kept current as
+# visits open and close so reports never scan the attendance table.
+#   visits            walk-ins that started in the hour
+#   completed         of those, visits that have ended
+#   dwell_seconds     total length of those completed visits
+#   present           completed visits that overlapped the hour
+#   occupied_seconds  student-seconds spent inside during the hour
+ROLLUP_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS occupancy_hourly (
+        date TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        section_id INTEGER NOT NULL,
+        visits INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        dwell_seconds INTEGER NOT NULL DEFAULT 0,
+        present INTEGER NOT NULL DEFAULT 0,
+        occupied_seconds INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (date, hour, section_id)
+    ) WITHOUT ROWID
+"""
+
+COUNTERS = ("visits", "completed", "dwell_seconds", "present", "occupied_seconds")
+
+UPSERT_SQL = (
+    f"INSERT INTO occupancy_hourly (date, hour, section_id, {', '.join(COUNTERS)}) VALUES (?,?,?,?,?,?,?,?) "
+    "ON CONFLICT(date, hour, section_id) DO UPDATE SET "
+    + ", ".join(f"{c} = {c} + excluded.{c}" for c in COUNTERS)
+)
+
+# Rows the backfill can read: well-formed dates and HH:MM:SS times
+_VALID_ROW = (
+    "date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' "
+    "AND in_time GLOB '[0-9][0-9]:[0-9][0-9]:[0-9][0-9]'"
+)
+_VALID_OUT = "out_time GLOB '[0-9][0-9]:[0-9][0-9]:[0-9][0-9]'"
+
+
+def create_schema(cur: sqlite3.Cursor):
+    cur.execute(ROLLUP_SCHEMA)
+
+
+# --- Incremental updates ---
+def hour_buckets(start: datetime, end: datetime):
+    """Yield (date, hour, seconds) for each clock hour the interval overlaps."""
+    hour_start = start.replace(minute=0, second=0, microsecond=0)
+    if end <= start:
+        return
+    while hour_start < end:
+        hour_end = hour_start + timedelta(hours=1)
+        seconds = (min(end, hour_end) - max(start, hour_start)).total_seconds()
+        yield hour_start.strftime("%Y-%m-%d"), hour_start.hour, int(seconds)
+        hour_start = hour_end
+
+
+def visit_opened(date_str: str, time_str: str, section_id: int) -> list[tuple[str, tuple]]:
+    """Statements counting a walk-in."""
+    return [(UPSERT_SQL, (date_str, int(time_str[:2]), section_id, 1, 0, 0, 0, 0))]
+
+
+def visit_closed(visit_date: str, in_time: str, out: datetime, section_id: int) -> list[tuple[str, tuple]]:
+    """Statements adding a finished visit's dwell time and hourly occupancy."""
+    start = datetime.strptime(f"{visit_date} {in_time}", "%Y-%m-%d %H:%M:%S")
+    dwell = max(0, int((out - start).total_seconds()))
+    statements = [(UPSERT_SQL, (visit_date, start.hour, section_id, 0, 1, dwell, 0, 0))]
+    for date_str, hour, seconds in hour_buckets(start, out):
+        statements.append((UPSERT_SQL, (date_str, hour, section_id, 0, 0, 0, 1, seconds)))
+    return statements
+
+
+# --- Backfill ---
+def _aggregate_python(visits: list[tuple]) -> dict[tuple, list[int]]:
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0])
+    for date_str, in_time, out_time, section_id in visits:
+        start = datetime.strptime(f"{date_str} {in_time}", "%Y-%m-%d %H:%M:%S")
+        counters = totals[(date_str, start.hour, section_id)]
+        counters[0] += 1
+        if out_time is None:
+            continue
+        end = datetime.strptime(f"{date_str} {out_time}", "%Y-%m-%d %H:%M:%S")
+        if end < start:  # walked out after midnight
+            end += timedelta(days=1)
+        counters[1] += 1
+        counters[2] += int((end - start).total_seconds())
+        for bucket_date, hour, seconds in hour_buckets(start, end):
+            bucket = totals[(bucket_date, hour, section_id)]
+            bucket[3] += 1
+            bucket[4] += seconds
+    return totals
+
+
+def _clock_seconds(times, np):
+    # "HH:MM:SS" strings -> seconds, reading the UTF-32 digits in place
+    digits = np.asarray(times, dtype="U8").view(np.uint32).reshape(-1, 8).astype(np.int64) - ord("0")
+    return (digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60 + digits[:, 6] * 10 + digits[:, 7]
+
+
+def _fold(totals: dict, np, hours, section, columns: dict):
+    """Sum each weight array per (hour since epoch, section) into ``totals``."""
+    keys, inverse = np.unique(np.stack([hours, section]), axis=1, return_inverse=True)
+    inverse = inverse.ravel()
+    sums = {col: np.bincount(inverse, weights=w, minlength=keys.shape[1]) for col, w in columns.items()}
+    stamps = (keys[0] * 3600).astype("datetime64[s]").tolist()
+    for i, (stamp, section_id) in enumerate(zip(stamps, keys[1].tolist())):
+        counters = totals[(stamp.strftime("%Y-%m-%d"), stamp.hour, section_id)]
+        for col, s in sums.items():
+            counters[col] += int(s[i])
+
+
+def _aggregate_numpy(visits: list[tuple], np) -> dict[tuple, list[int]]:
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0])
+    if not visits:
+        return totals
+    dates, in_times, out_times, sections = zip(*visits)
+    day = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+    section = np.asarray(sections, dtype=np.int64)
+    start = day * 86400 + _clock_seconds(in_times, np)
+    _fold(totals, np, start // 3600, section, {0: np.ones(len(start))})
+
+    closed = np.array([o is not None for o in out_times])
+    if not closed.any():
+        return totals
+    start, section = start[closed], section[closed]
+    end = day[closed] * 86400 + _clock_seconds([o for o in out_times if o is not None], np)
+    end = np.where(end < start, end + 86400, end)  # walked out after midnight
+    start_hour = start // 3600
+    _fold(totals, np, start_hour, section, {1: np.ones(len(start)), 2: (end - start).astype(np.float64)})
+
+    # One entry per (visit, clock hour it overlaps)
+    spans = np.maximum(end - 1, start) // 3600 - start_hour + 1
+    visit = np.repeat(np.arange(len(start)), spans)
+    hours = start_hour[visit] + np.arange(len(visit)) - np.repeat(np.cumsum(spans) - spans, spans)
+    overlap = np.minimum(end[visit], (hours + 1) * 3600) - np.maximum(start[visit], hours * 3600)
+    _fold(totals, np, hours, section[visit], {3: (overlap > 0).astype(np.float64), 4: overlap.astype(np.float64)})
+    return totals
+
+
+def _read_visits(conn: sqlite3.Connection, table: str) -> list[tuple]:
+    return conn.execute(
+        "SELECT date, in_time, "
+        f"CASE WHEN status = 'Completed' AND {_VALID_OUT} THEN out_time END, "
+        "COALESCE(section_id, 0) "
+        f"FROM {table} WHERE {_VALID_ROW}"
+    ).fetchall()
+
+
+def _aggregate(visits: list[tuple]) -> dict[tuple, list[int]]:
+    """Rollup counters for ``visits``: NumPy when installed, pure Python otherwise."""
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    return _aggregate_numpy(visits, np) if np is not None else _aggregate_python(visits)
+
+
+def backfill(conn: sqlite3.Connection) -> int:
+    """Rebuild occupancy_hourly from every visit, archived terms included.
+
+    Returns the number of visits read.
+    """
+    visits = []
+    for table in archive.partitions(conn):
+        visits += _read_visits(conn, table)
+    totals = _aggregate(visits)
+    with conn:
+        conn.execute("DELETE FROM occupancy_hourly")
+        conn.executemany(
+            f"INSERT INTO occupancy_hourly (date, hour, section_id, {', '.join(COUNTERS)}) VALUES (?,?,?,?,?,?,?,?)",
+            [(*key, *counters) for key, counters in totals.items()],
+        )
+    return len(visits)
+
+
+def subtract_live(conn: sqlite3.Connection) -> int:
+    """Take the live table's visits out of the rollups, before it is emptied.
+
+    Reads only the live table, so it is cheap enough to run under the scan
+    write lock. Does not commit: run it in the same transaction as the
+    DELETE. Returns the number of visits subtracted.
+    """
+    visits = _read_visits(conn, "attendance")
+    conn.executemany(
+        "UPDATE occupancy_hourly SET "
+        + ", ".join(f"{c} = MAX(0, {c} - ?)" for c in COUNTERS)
+        + " WHERE date = ? AND hour = ? AND section_id = ?",
+        [(*counters, *key) for key, counters in _aggregate(visits).items()],
+    )
+    conn.execute("DELETE FROM occupancy_hourly WHERE " + " AND ".join(f"{c} = 0" for c in COUNTERS))
+    return len(visits)
+
+
+def needs_backfill(conn: sqlite3.Connection) -> bool:
+    empty = conn.execute("SELECT 1 FROM occupancy_hourly LIMIT 1").fetchone() is None
+    return empty and conn.execute("SELECT 1 FROM attendance LIMIT 1").fetchone() is not None
+
+
+# --- Reports ---
+def report(conn: sqlite3.Connection, where_sql: str = "", params: list | tuple = ()) -> dict:
+    """Hourly occupancy profile, peak hour and per-section visit stats."""
+    days = conn.execute(f"SELECT COUNT(DISTINCT date) FROM occupancy_hourly{where_sql}", params).fetchone()[0]
+    hourly = [
+        {
+            "hour": hour,
+            "visits": visits,
+            "present": present,
+            # Average number of students inside during this hour of the day
+            "avg_occupancy": round(occupied / 3600 / days, 2) if days else 0,
+        }
+        for hour, visits, present, occupied in conn.execute(
+            "SELECT hour, SUM(visits), SUM(present), SUM(occupied_seconds) "
+            f"FROM occupancy_hourly{where_sql} GROUP BY hour ORDER BY hour",
+            params,
+        )
+    ]
+    peak = conn.execute(
+        "SELECT date, hour, SUM(occupied_seconds) AS occupied FROM occupancy_hourly"
+        f"{where_sql} GROUP BY date, hour ORDER BY occupied DESC LIMIT 1",
+        params,
+    ).fetchone()
+    sections = [
+        {
+            "section": name or "—",
+            "visits": visits,
+            "completed": completed,
+            "avg_dwell_seconds": round(dwell / completed) if completed else 0,
+        }
+        for name, visits, completed, dwell in conn.execute(
+            "SELECT s.name, SUM(o.visits), SUM(o.completed), SUM(o.dwell_seconds) "
+            f"FROM occupancy_hourly o LEFT JOIN sections s ON s.id = o.section_id{where_sql} "
+            "GROUP BY o.section_id ORDER BY SUM(o.visits) DESC",
+            params,
+        )
+    ]
+    return {
+        "days": days,
+        "hourly": hourly,
+        "peak": {"date": peak[0], "hour": peak[1], "avg_occupancy": round(peak[2] / 3600, 2)} if peak and peak[2] else None,
+        "sections": sections,
+    }
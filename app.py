@@ -1,11 +1,22 @@
+import atexit
 import os
+import signal
 import sqlite3
 import threading
 from datetime import datetime, timedelta
 from threading import Thread
-from flask import Flask, render_template, jsonify, request, send_file, session, redirect, url_for, render_template_string
-import json
-from flask_socketio import SocketIO
+from flask import Flask, Response, render_template, jsonify, request, send_file, session, redirect, url_for, render_template_string
+from flask_socketio import SocketIO, join_room
+
+import analytics
+import archive
+import db
+import metrics
+from debounce import ScanDebouncer
+from exports import ExportSpec, attendance_filters, fmt_date_display
+from broadcaster import Broadcaster
+from export_jobs import MIMETYPES, ExportJobs
+from roster import Roster
 
 app = Flask(__name__)
 app.secret_key = "replace_with_your_secret"
@@ -20,76 +31,121 @@ app.config["PERMANENT_SESSION_LIFETIME"] = 0
 
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# SQLite database path
 BASE_DIR = os.path.dirname(__file__)
-DB_PATH = os.path.join(BASE_DIR, "attendance.db")
 
-# --- Presentation utilities ---
-def _fmt_date_display(date_str: str | None) -> str:
-    try:
-        if not date_str:
-            return ""
-        # Expecting DB format YYYY-MM-DD → display as DD-MM-YYYY
-        dt = datetime.strptime(date_str, "%Y-%m-%d")
-        return dt.strftime("%d-%m-%Y")
-    except Exception:
-        return date_str or ""
+# --- Change tracking ---
+# Every inserted/updated attendance row is stamped with a monotonically
+# increasing version so dashboards can poll for deltas instead of reloading.
+_write_lock = threading.Lock()
+_data_version = 0  # last version handed out
+_committed_version = 0  # last version visible in SQLite
+_reset_version = 0  # version at which the table was last cleared
+_next_id = 1  # attendance ids are assigned here so write-behind can queue inserts
+
+# --- Write-behind ---
+# When enabled, scans are decided and broadcast from memory and their
+# INSERT/UPDATEs are group-committed by one writer thread.
+WRITE_BEHIND_ENABLED = False
+WRITE_BEHIND_FLUSH_MS = 50
+WRITE_BEHIND_MAX_BATCH = 200
+# How long clear/export/maintenance wait for queued writes before giving up
+WRITE_BEHIND_FLUSH_TIMEOUT = 10
+_write_behind = None
+
+# barcode -> (id, date, in_time, name, class) of that student's open
+# ("In Library") attendance row, enough to push the full row on walk-out.
+# Authoritative for the in/out decision; only mutated under _write_lock.
+_open_visits: dict[str, tuple[int, str, str, str, str]] = {}
+
+# Today's walk-in/walk-out/active counts, maintained alongside every write
+# so update_summary never has to count rows. Guarded by _write_lock.
+_summary = {"date": None, "walkins": 0, "walkouts": 0, "active": 0}
+
+# --- Scan debounce ---
+# Repeat scans of one barcode within this many seconds (a slow beep, a
+# second gate) are dropped before they reach SQLite or Socket.IO. 0 disables.
+SCAN_DEBOUNCE_SECONDS = 5
+_debouncer = ScanDebouncer(SCAN_DEBOUNCE_SECONDS)
+
+# --- Instrumentation ---
+# Per-stage scan timings for /metrics; scans slower than SLOW_SCAN_MS are
+# logged with their breakdown (0 disables the log).
+METRICS_ENABLED = True
+SLOW_SCAN_MS = 250
+metrics.configure(METRICS_ENABLED, SLOW_SCAN_MS)
 
 # --- Load students ---
-all_students = {}
-
-def _normalize_student(raw: dict) -> dict:
-    name = (
-        raw.get("name")
-        or raw.get("student_name")
-        or raw.get("fullName")
-        or raw.get("studentName")
-        or ""
-    )
-    section = raw.get("section") or raw.get("class") or raw.get("dept") or ""
-    clazz = raw.get("section") or raw.get("class") or raw.get("dept") or "—"
-    return {"name": name, "section": section, "class": clazz}
-
-
-def _load_students():
-    global all_students
-    all_students = {}
-    candidates = []
-    student_dir = os.path.join(BASE_DIR, "student_data")
-    if os.path.isdir(student_dir):
-        for fname in os.listdir(student_dir):
-            if fname.lower().endswith(".json"):
-                candidates.append(os.path.join(student_dir, fname))
-
-    for legacy in ("final_year.json", "second_year.json"):
-        legacy_path = os.path.join(BASE_DIR, legacy)
-        if os.path.exists(legacy_path):
-            candidates.append(legacy_path)
-
-    for path in candidates:
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if isinstance(data, dict) and "students" in data and isinstance(data["students"], list):
-                for s in data["students"]:
-                    roll = str(s.get("roll") or s.get("roll_no") or s.get("id") or "").strip()
-                    if not roll:
-                        continue
-                    all_students[roll.upper()] = _normalize_student(s)
-            elif isinstance(data, dict):
-                for k, v in data.items():
-                    roll = str(k).strip()
-                    if not roll:
-                        continue
-                    v = v if isinstance(v, dict) else {}
-                    all_students[roll.upper()] = _normalize_student(v)
-        except Exception as e:
-            print(f"Failed to load students from {path}: {e}")
+# Barcode -> Student, hot-reloaded when files in student_data/ change
+roster = Roster(BASE_DIR)
 
 
 # --- Database Setup ---
+def _has_column(cur: sqlite3.Cursor, table: str, column: str) -> bool:
+    return any(r[1] == column for r in cur.execute(f"PRAGMA table_info({table})"))
+
+
+def _migration_1_section_column(cur: sqlite3.Cursor):
+    if not _has_column(cur, "attendance", "section"):
+        cur.execute("ALTER TABLE attendance ADD COLUMN section TEXT")
+
+
+def _migration_2_version_column(cur: sqlite3.Cursor):
+    if not _has_column(cur, "attendance", "version"):
+        cur.execute("ALTER TABLE attendance ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def _migration_3_indexes(cur: sqlite3.Cursor):
+    # Per-scan open-visit lookup: only rows still "In Library" are indexed
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attendance_open ON attendance(barcode, id) "
+        "WHERE status = 'In Library'"
+    )
+    # Daily summary counts and date-range filters
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date_status ON attendance(date, status)")
+    # Delta polling by version cursor
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_attendance_version ON attendance(version)")
+
+
+def _migration_4_sections(cur: sqlite3.Cursor):
+    # Normalised section dimension so department filters are indexed lookups
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    if not _has_column(cur, "attendance", "section_id"):
+        cur.execute("ALTER TABLE attendance ADD COLUMN section_id INTEGER REFERENCES sections(id)")
+    cur.execute(
+        "INSERT OR IGNORE INTO sections (name) "
+        "SELECT section FROM attendance WHERE section IS NOT NULL "
+        "UNION SELECT class FROM attendance WHERE class IS NOT NULL"
+    )
+    cur.execute(
+        "UPDATE attendance SET section_id = "
+        "(SELECT id FROM sections WHERE name = COALESCE(attendance.section, attendance.class)) "
+        "WHERE section_id IS NULL"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_attendance_section ON attendance(section_id, id)")
+
+
+def _migration_5_rollups(cur: sqlite3.Cursor):
+    # Hourly occupancy/dwell counters behind /api/analytics; filled by init_db
+    analytics.create_schema(cur)
+
+
+# Applied in order; PRAGMA user_version records how many have run.
+MIGRATIONS = [
+    _migration_1_section_column,
+    _migration_2_version_column,
+    _migration_3_indexes,
+    _migration_4_sections,
+    _migration_5_rollups,
+]
+
+
 def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
+    with db.get_connection() as conn:
         cur = conn.cursor()
         cur.execute("""
             CREATE TABLE IF NOT EXISTS attendance (
@@ -105,85 +161,256 @@ def init_db():
             )
         """)
         conn.commit()
-        try:
-            cur.execute("ALTER TABLE attendance ADD COLUMN section TEXT")
+
+        current = cur.execute("PRAGMA user_version").fetchone()[0]
+        for target, migrate in enumerate(MIGRATIONS[current:], start=current + 1):
+            migrate(cur)
+            cur.execute(f"PRAGMA user_version = {target}")
             conn.commit()
-        except Exception:
-            pass
+            print(f"Database migrated to schema version {target}")
+        _load_data_version(conn)
+        _load_sections(conn)
+        if analytics.needs_backfill(conn):
+            print(f"Built occupancy rollups from {analytics.backfill(conn)} visits")
+        _load_open_visits(conn)
+        with _write_lock:
+            _rebuild_summary(conn, datetime.now().strftime("%Y-%m-%d"))
+
+
+def _load_data_version(conn: sqlite3.Connection):
+    global _data_version, _committed_version, _next_id
+    row = conn.execute("SELECT MAX(version), MAX(id) FROM attendance").fetchone()
+    _data_version = max(_data_version, row[0] or 0)
+    _committed_version = _data_version
+    # AUTOINCREMENT never reuses ids, even after clear_attendance
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='attendance'").fetchone()
+    _next_id = max(_next_id, (row[1] or 0) + 1, (seq[0] if seq else 0) + 1)
+
+
+# section name -> sections.id, covering every section in the roster
+_section_ids: dict[str, int] = {}
+
+
+def _load_sections(conn: sqlite3.Connection):
+    names = roster.sections()
+    names.add("—")
+    conn.executemany("INSERT OR IGNORE INTO sections (name) VALUES (?)", [(n,) for n in names])
+    conn.commit()
+    _section_ids.clear()
+    _section_ids.update(conn.execute("SELECT name, id FROM sections"))
+
+
+def _section_id(conn: sqlite3.Connection, name: str) -> int:
+    section_id = _section_ids.get(name)
+    if section_id is None:
+        # A section the roster didn't have at startup; register it once
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO sections (name) VALUES (?)", (name,))
+        section_id = conn.execute("SELECT id FROM sections WHERE name=?", (name,)).fetchone()[0]
+        _section_ids[name] = section_id
+    return section_id
+
+
+def _load_open_visits(conn: sqlite3.Connection):
+    rows = conn.execute(
+        "SELECT barcode, id, date, in_time, name, class FROM attendance WHERE status='In Library' ORDER BY id ASC"
+    ).fetchall()
+    with _write_lock:
+        _open_visits.clear()
+        # Ascending order: the newest open row wins if a barcode has several
+        for barcode, *visit in rows:
+            _open_visits[barcode] = tuple(visit)
+
+
+def _rebuild_summary(conn: sqlite3.Connection, today: str):
+    """Recount today's summary from the table. Caller holds _write_lock."""
+    row = conn.execute(
+        "SELECT COUNT(*), "
+        "COALESCE(SUM(status='Completed'), 0), "
+        "COALESCE(SUM(status='In Library'), 0) "
+        "FROM attendance WHERE date=?",
+        (today,),
+    ).fetchone()
+    _summary.update(date=today, walkins=row[0], walkouts=row[1], active=row[2])
+
+
+def _roll_summary(conn: sqlite3.Connection | None, today: str):
+    """Start a new day's counters once the date changes. Caller holds _write_lock."""
+    if _summary["date"] == today:
+        return
+    if conn is None:
+        with db.get_connection() as conn:
+            _rebuild_summary(conn, today)
+    else:
+        _rebuild_summary(conn, today)
 
 
 # --- Determine In/Out ---
 def determine_in_out(conn: sqlite3.Connection, barcode: str, student_name: str | None, section: str | None):
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id FROM attendance WHERE barcode=? AND status=? ORDER BY id DESC LIMIT 1",
-        (barcode, "In Library"),
-    )
-    row = cur.fetchone()
+    global _data_version
+    # Serialise writers so versions become visible to pollers in commit order
+    with _write_lock:
+        record = _determine_in_out(conn, barcode, student_name, section, _data_version + 1)
+        _data_version += 1
+    return record
+
+
+def _write(conn: sqlite3.Connection, statements: list[tuple[str, tuple]], version: int):
+    """Apply one scan's statements now, or hand them to the write-behind queue."""
+    global _committed_version
+    if _write_behind is not None:
+        for sql, params in statements:
+            _write_behind.submit(sql, params, version)
+        return
+    with metrics.timer("db_write"):
+        for sql, params in statements:
+            conn.execute(sql, params)
+        conn.commit()
+    _committed_version = version
+
+
+def _flush_writes():
+    """Wait until queued scans are in SQLite; raise if the writer is failing."""
+    if _write_behind is not None and not _write_behind.flush(WRITE_BEHIND_FLUSH_TIMEOUT):
+        raise RuntimeError(f"Queued attendance writes are not saved yet: {_write_behind.error}")
+
+
+def _on_write_behind_commit(version: int):
+    global _committed_version
+    _committed_version = version
+
+
+def _determine_in_out(conn: sqlite3.Connection, barcode: str, student_name: str | None, section: str | None, version: int):
+    global _next_id
+    open_visit = _open_visits.get(barcode)
     now = datetime.now()
     date_str = now.strftime("%Y-%m-%d")
     time_str = now.strftime("%H:%M:%S")
-
-    if row:  # Walk-Out
-        record_id = row[0]
-        cur.execute(
-            "UPDATE attendance SET out_time=?, status=? WHERE id=?",
-            (time_str, "Completed", record_id),
+    _roll_summary(conn, date_str)
+
+    if open_visit is not None:  # Walk-Out
+        record_id, visit_date, in_time, stored_name, stored_class = open_visit
+        _write(
+            conn,
+            [("UPDATE attendance SET out_time=?, status=?, version=? WHERE id=?", (time_str, "Completed", version, record_id))]
+            + analytics.visit_closed(visit_date, in_time, now.replace(microsecond=0), _section_id(conn, stored_class)),
+            version,
         )
-        conn.commit()
+        del _open_visits[barcode]
+        # Visits are counted against the day they started
+        if visit_date == date_str:
+            _summary["walkouts"] += 1
+            _summary["active"] -= 1
+        # The row as stored, so it can replace the client's copy as-is
         return {
+            "id": record_id,
             "roll": barcode,
             "barcode": barcode,
-            "name": student_name or f"Student {barcode}",
-            "class": "BCA",
+            "name": stored_name,
+            "class": stored_class,
             "section": section or "—",
-            "date": date_str,
-            "inTime": "",
+            "date": visit_date,
+            "dateDisplay": fmt_date_display(visit_date),
+            "inTime": in_time,
             "outTime": time_str,
             "status": "Completed",
+            "version": version,
             "action": "Walk-Out",
         }
 
     # Walk-In
-    cur.execute(
-        "INSERT INTO attendance (barcode, name, section, class, date, in_time, status) VALUES (?,?,?,?,?,?,?)",
-        (barcode, student_name or f"Student {barcode}", section or "—", (section or "—"), date_str, time_str, "In Library"),
+    record_id = _next_id
+    section_id = _section_id(conn, section or "—")
+    _write(
+        conn,
+        [(
+            "INSERT INTO attendance (id, barcode, name, section, section_id, class, date, in_time, status, version) VALUES (?,?,?,?,?,?,?,?,?,?)",
+            (record_id, barcode, student_name or f"Student {barcode}", section or "—", section_id, (section or "—"), date_str, time_str, "In Library", version),
+        )]
+        + analytics.visit_opened(date_str, time_str, section_id),
+        version,
     )
-    conn.commit()
+    _next_id += 1
+    _open_visits[barcode] = (record_id, date_str, time_str, student_name or f"Student {barcode}", section or "—")
+    _summary["walkins"] += 1
+    _summary["active"] += 1
     return {
+        "id": record_id,
         "roll": barcode,
         "barcode": barcode,
         "name": student_name or f"Student {barcode}",
         "class": section or "—",
         "section": section or "—",
         "date": date_str,
+        "dateDisplay": fmt_date_display(date_str),
         "inTime": time_str,
         "outTime": "—",
         "status": "In Library",
+        "version": version,
         "action": "Walk-In",
     }
 
 
 # --- Real-time Summary Update Function ---
-def emit_summary_update():
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        today = datetime.now().strftime("%Y-%m-%d")
+def current_summary() -> dict:
+    with _write_lock:
+        _roll_summary(None, datetime.now().strftime("%Y-%m-%d"))
+        return {
+            "walkins": _summary["walkins"],
+            "walkouts": _summary["walkouts"],
+            "active": _summary["active"],
+        }
 
-        cur.execute("SELECT COUNT(*) FROM attendance WHERE date=?", (today,))
-        total_walkins = cur.fetchone()[0] or 0
 
-        cur.execute("SELECT COUNT(*) FROM attendance WHERE date=? AND status='Completed'", (today,))
-        total_walkouts = cur.fetchone()[0] or 0
+# --- Live updates ---
+# Scans and summary changes go out in scans_batch frames, one per room
+# every BROADCAST_FLUSH_MS.
+BROADCAST_FLUSH_MS = 150
+broadcaster = Broadcaster(socketio, current_summary, flush_interval_ms=BROADCAST_FLUSH_MS)
 
-        cur.execute("SELECT COUNT(*) FROM attendance WHERE date=? AND status='In Library'", (today,))
-        active_students = cur.fetchone()[0] or 0
 
-    socketio.emit("update_summary", {
-        "walkins": total_walkins,
-        "walkouts": total_walkouts,
-        "active": active_students
-    })
+# Rows in the snapshot a dashboard receives on connect
+SNAPSHOT_ROWS = 1000
+
+
+@socketio.on("connect")
+def on_connect():
+    # Join before reading, so a scan in between arrives as a frame and
+    # at worst duplicates a snapshot row
+    broadcaster.subscribe(request.sid)
+    version = _committed_version
+    with db.get_connection() as conn:
+        rows = conn.execute(
+            f"SELECT {ATTENDANCE_COLUMNS} FROM attendance ORDER BY id DESC LIMIT ?", (SNAPSHOT_ROWS,)
+        ).fetchall()
+    rows.reverse()
+    # Column names once plus value arrays, rather than a dict per row
+    socketio.emit("snapshot", {
+        "fields": ATTENDANCE_COLUMNS.split(", "),
+        "rows": rows,
+        "version": version,
+        "summary": current_summary(),
+    }, to=request.sid)
+
+
+@socketio.on("sync")
+def on_sync(data):
+    """Rows changed after the client's version; used after a missed frame."""
+    since = data.get("since") if isinstance(data, dict) else None
+    return _attendance_since(since if isinstance(since, int) else None)
+
+
+@socketio.on("disconnect")
+def on_disconnect():
+    broadcaster.unsubscribe(request.sid)
+
+
+@socketio.on("subscribe")
+def on_subscribe(data):
+    """Narrow this client's feed to one section or gate; no filter means all."""
+    data = data if isinstance(data, dict) else {}
+    room = broadcaster.subscribe(request.sid, data.get("section") or None, data.get("gate") or None)
+    return {"room": room}
 
 
 # --- Routes ---
@@ -192,60 +419,172 @@ def index():
     return render_template("index.html")
 
 
+ATTENDANCE_COLUMNS = "id, barcode, name, section, class, date, in_time, out_time, status, version"
+# Most rows /api/attendance and the socket sync return; a client further
+# behind than this gets reset: true and the latest rows instead of a delta
+ATTENDANCE_ROWS = 1000
+
+
+def _attendance_row(r) -> dict:
+    return {
+        "id": r[0],
+        "roll": r[1],
+        "barcode": r[1],
+        "name": r[2],
+        "section": r[3],
+        "class": r[4],
+        "date": r[5],
+        "dateDisplay": fmt_date_display(r[5]),
+        "inTime": r[6],
+        "outTime": r[7] if r[7] else "—",
+        "status": r[8],
+        "version": r[9],
+    }
+
+
 @app.get("/api/attendance")
 def get_attendance():
-    with sqlite3.connect(DB_PATH) as conn:
+    """Latest ATTENDANCE_ROWS rows, or only the rows changed after a cursor.
+
+    ``since_version`` returns rows inserted or updated after that version,
+    ``since_id`` returns rows inserted after that id. ``reset`` tells the
+    client to drop its copy (the table was cleared, the cursor is unknown,
+    or more than ATTENDANCE_ROWS rows changed since it).
+    """
+    return jsonify(_attendance_since(
+        request.args.get("since_version", type=int),
+        request.args.get("since_id", type=int),
+    ))
+
+
+def _attendance_since(since_version: int | None = None, since_id: int | None = None) -> dict:
+    # Read the version before querying: a concurrent write is then re-sent on
+    # the next poll rather than skipped.
+    version = _committed_version
+    reset = False
+
+    if since_version is not None:
+        if since_version == version:
+            return {"attendance": [], "version": version, "reset": False}
+        if since_version > version or since_version < _reset_version:
+            reset = True
+            since_version = None
+
+    with metrics.timer("db_attendance_query"), db.get_connection() as conn:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT barcode, name, section, class, date, in_time, out_time, status FROM attendance ORDER BY id DESC LIMIT 1000"
-        )
-        rows = cur.fetchall()
-        data = [
-            {
-                "roll": r[0],
-                "barcode": r[0],
-                "name": r[1],
-                "section": r[2],
-                "class": r[3],
-                "date": r[4],
-                "dateDisplay": _fmt_date_display(r[4]),
-                "inTime": r[5],
-                "outTime": r[6] if r[6] else "—",
-                "status": r[7],
-            }
-            for r in rows
-        ]
-      
-        return jsonify({"attendance": list(reversed(data))})
+        rows = None
+        if since_version is not None:
+            cur.execute(
+                f"SELECT {ATTENDANCE_COLUMNS} FROM attendance WHERE version > ? ORDER BY version ASC LIMIT ?",
+                (since_version, ATTENDANCE_ROWS + 1),
+            )
+            rows = cur.fetchall()
+        elif since_id is not None and not reset:
+            cur.execute(
+                f"SELECT {ATTENDANCE_COLUMNS} FROM attendance WHERE id > ? ORDER BY id ASC LIMIT ?",
+                (since_id, ATTENDANCE_ROWS + 1),
+            )
+            rows = cur.fetchall()
+        if rows is not None and len(rows) > ATTENDANCE_ROWS:
+            # Too far behind: a fresh copy costs no more than the capped reload
+            rows = None
+            reset = True
+        if rows is None:
+            cur.execute(
+                f"SELECT {ATTENDANCE_COLUMNS} FROM attendance ORDER BY id DESC LIMIT ?", (ATTENDANCE_ROWS,)
+            )
+            rows = cur.fetchall()
+            rows.reverse()
+
+        return {"attendance": [_attendance_row(r) for r in rows], "version": version, "reset": reset}
+
+
+@app.get("/api/attendance/query")
+def query_attendance():
+    """One page of attendance rows, newest first, filtered on the server.
+
+    Paging is keyset based: pass the returned ``next_cursor`` as ``before_id``
+    to fetch the following page, so deep pages cost the same as the first.
+    """
+    department = (request.args.get("department") or "").strip()
+    start_date = (request.args.get("startDate") or "").strip()
+    end_date = (request.args.get("endDate") or "").strip()
+    search = (request.args.get("q") or "").strip()
+    limit = max(1, min(500, request.args.get("limit", 20, type=int)))
+    before_id = request.args.get("before_id", type=int)
+
+    clauses, params = attendance_filters(department, start_date, end_date, search)
+    if before_id is not None:
+        clauses.append("id < ?")
+        params.append(before_id)
+    where_sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+
+    # The live table and any archived terms in range each give their newest
+    # rows; the page is the newest of those.
+    rows = []
+    with db.get_connection() as conn:
+        for table in archive.partitions(conn, start_date, end_date):
+            rows += conn.execute(
+                f"SELECT {ATTENDANCE_COLUMNS} FROM {table}{where_sql} ORDER BY id DESC LIMIT ?",
+                params + [limit + 1],
+            ).fetchall()
+    rows.sort(key=lambda r: r[0], reverse=True)
+    rows = rows[:limit + 1]
+
+    has_more = len(rows) > limit
+    data = [_attendance_row(r) for r in rows[:limit]]
+    return jsonify({
+        "attendance": data,
+        "has_more": has_more,
+        "next_cursor": data[-1]["id"] if has_more else None,
+    })
 
 
 @app.route('/api/clear_attendance', methods=['DELETE'])
 def clear_attendance():
+    """Clear the current term: empty the live attendance table.
+
+    Archived terms are kept, both their files and their occupancy rollups,
+    so past terms still show up in queries, exports and analytics.
+    """
+    global _data_version, _committed_version, _reset_version
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("DELETE FROM attendance")
-        conn.commit()
-        conn.close()
-        emit_summary_update()  # 🔄 refresh after clearing
+        with _write_lock:
+            _flush_writes()
+            with db.get_connection() as conn:
+                analytics.subtract_live(conn)
+                conn.execute("DELETE FROM attendance")
+            _open_visits.clear()
+            _debouncer.clear()
+            _summary.update(date=datetime.now().strftime("%Y-%m-%d"), walkins=0, walkouts=0, active=0)
+            _data_version += 1
+            _committed_version = _reset_version = _data_version
+        broadcaster.reset(_reset_version)  # 🔄 clients drop their rows
+
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
 # --- Barcode Callback ---
-def on_barcode(barcode_value: str):
+def on_barcode(barcode_value: str, gate: str | None = None):
     barcode_value = (barcode_value or "").strip()
     if not barcode_value:
         return
-    with sqlite3.connect(DB_PATH) as conn:
-        student = all_students.get(barcode_value.upper())
-        # Only record and show in UI if the student is present in loaded data
-        if not student:
-            return
-        student_name = (student.get("name") or "").strip() or None
-        section = (student.get("section") or "").strip() or None
-        record = determine_in_out(conn, barcode_value, student_name, section)
+    if not _debouncer.accept(barcode_value.upper()):
+        return
+    trace = metrics.start_scan(barcode_value)
+    student = roster.get(barcode_value)
+    # Only record and show in UI if the student is present in loaded data
+    if not student:
+        return
+    if trace:
+        trace.mark("roster_lookup")
+    section = student.section
+    with db.get_connection() as conn:
+        record = determine_in_out(conn, barcode_value, student.name, section)
+    if trace:
+        trace.mark("determine_in_out")
     payload = {
         "roll_no": barcode_value,
         "student_name": record.get("name"),
@@ -253,19 +592,147 @@ def on_barcode(barcode_value: str):
         "action": record.get("action"),
         # Prefer outTime only if it's a real timestamp; otherwise use inTime
         "time": (record.get("outTime") if record.get("outTime") not in (None, "", "—") else record.get("inTime")),
+        "gate": gate,
+        "row": record,  # the full attendance row, carrying its version
     }
-    socketio.emit("barcode_scanned", payload)
-    emit_summary_update()  # 🔄 emit live summary update
+    broadcaster.publish(payload, record["version"], section, gate)  # 🔄 summary rides along
+    if trace:
+        trace.mark("publish")
+        trace.finish()
+
+
+def start_write_behind():
+    global _write_behind
+    if not WRITE_BEHIND_ENABLED or _write_behind is not None:
+        return
+    from write_behind import WriteBehindQueue
+
+    _write_behind = WriteBehindQueue(
+        flush_interval_ms=WRITE_BEHIND_FLUSH_MS,
+        max_batch=WRITE_BEHIND_MAX_BATCH,
+        on_commit=_on_write_behind_commit,
+    )
+    _write_behind.start()
+    # Guarantee queued scans reach disk when the server shuts down; atexit
+    # covers a normal exit, install_shutdown_handlers SIGTERM and Ctrl+C
+    atexit.register(_write_behind.stop)
+
+
+def _shutdown(signum, frame):
+    print(f"Received {signal.Signals(signum).name}, saving queued scans")
+    if _write_behind is not None:
+        _write_behind.stop()
+    raise SystemExit(0)
+
+
+def install_shutdown_handlers():
+    """Flush write-behind on SIGTERM/SIGINT, which skip atexit by default."""
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, _shutdown)
+
+
+# --- Analytics ---
+@app.get("/api/analytics")
+def get_analytics():
+    """Hourly occupancy, peak hour and average visit length per section.
+
+    Served from the occupancy_hourly rollups; accepts the same
+    ``department``/``startDate``/``endDate`` filters as the exports.
+    """
+    clauses, params = attendance_filters(
+        (request.args.get("department") or "").strip(),
+        (request.args.get("startDate") or "").strip(),
+        (request.args.get("endDate") or "").strip(),
+    )
+    where_sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    try:
+        _flush_writes()
+    except RuntimeError as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+    with metrics.timer("db_analytics_query"), db.get_connection() as conn:
+        data = analytics.report(conn, where_sql, params)
+    data["active"] = current_summary()["active"]
+    return jsonify(data)
+
+
+# --- Archive & maintenance ---
+# Finished visits from past terms move to archive/attendance-<term>.db every
+# night at archive.MAINTENANCE_HOUR, keeping the live table to the current term.
+def run_maintenance() -> dict:
+    with _write_lock:
+        _flush_writes()
+        moved = archive.archive_closed_terms(db.get_connection())
+    stats = archive.compact(db.get_connection())
+    print(f"Database maintenance: archived {sum(moved.values())} rows, {stats}")
+    return {"archived": moved, **stats}
+
+
+@app.post("/api/maintenance")
+def api_maintenance():
+    """Run the nightly archive + compaction now."""
+    try:
+        return jsonify({"success": True, **run_maintenance()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
 
 
 # --- Background Scanner ---
+# "threads": one blocking reader thread per scanner plus a dispatcher.
+# "cooperative": a single task polls every scanner on the Socket.IO loop.
+# "managed": every configured scanner at once, with hot-plug and reconnect.
+SCANNER_MODE = "managed"
 _scanner_thread = None
+_scanner_manager = None
+
+
+def _listener_running() -> bool:
+    t = _scanner_thread
+    if t is None:
+        return False
+    if hasattr(t, "is_alive"):
+        return t.is_alive()
+    return not getattr(t, "dead", True)  # eventlet GreenThread
+
 
 def start_barcode_listener_background():
-    global _scanner_thread
-    if _scanner_thread and _scanner_thread.is_alive():
+    global _scanner_thread, _scanner_manager
+    if _listener_running():
         return False
 
+    if SCANNER_MODE == "managed":
+        from scanner_manager import ScannerManager
+
+        _scanner_manager = ScannerManager()
+
+        def run():
+            try:
+                _scanner_manager.run(on_barcode)
+            except Exception as e:
+                print(f"Scanner manager exited: {e}")
+
+        _scanner_thread = Thread(target=run, daemon=True)
+        _scanner_thread.start()
+        return True
+
+    if SCANNER_MODE == "cooperative":
+        from both_test import cooperative_listener
+
+        blocking = None
+        if socketio.async_mode == "eventlet":
+            from eventlet import tpool
+
+            blocking = tpool.execute  # USB reads wait off the hub
+
+        def run():
+            try:
+                cooperative_listener(on_barcode, socketio.sleep, with_gate=True, blocking=blocking)
+            except Exception as e:
+                print(f"Scanner listener exited: {e}")
+
+        # A green thread under eventlet, a regular thread otherwise
+        _scanner_thread = socketio.start_background_task(run)
+        return True
+
     from both_test import main_listener
 
     def run():
@@ -285,6 +752,34 @@ def api_start_scanner():
     return jsonify({"success": True, "started": started})
 
 
+metrics.gauge("attendance_scan_queue_depth", "Scans waiting for the dispatcher", lambda: _scanner_module().scan_queue.qsize())
+metrics.gauge("attendance_scans", "Scan queue counters since start", lambda: _scanner_module().get_scan_stats(), label="counter")
+metrics.gauge("attendance_write_behind_pending", "Writes queued for group commit", lambda: _write_behind.pending() if _write_behind else 0)
+metrics.gauge("attendance_write_behind_failing", "1 while group commits are failing and being retried", lambda: int(bool(_write_behind and _write_behind.error)))
+metrics.gauge("attendance_broadcast_pending", "Scans waiting for the next broadcast frame", lambda: broadcaster.pending())
+metrics.gauge("attendance_open_visits", "Students currently in the library", lambda: len(_open_visits))
+metrics.gauge("attendance_data_version", "Last committed attendance version", lambda: _committed_version)
+metrics.gauge("attendance_debounced_scans", "Repeat scans dropped by the debounce window", lambda: _debouncer.dropped)
+
+
+def _scanner_module():
+    import both_test
+
+    return both_test
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/api/scanners")
+def api_scanners():
+    if _scanner_manager is None:
+        return jsonify({"mode": SCANNER_MODE, "gates": {}})
+    return jsonify({"mode": SCANNER_MODE, "gates": _scanner_manager.status()})
+
+
 # --- Admin Login ---
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "1"
@@ -313,10 +808,16 @@ def require_login():
     open_routes = (
         "login",
         "static",
+        "api_scanners",
+        "metrics_endpoint",
         "api_start_scanner",
         "get_attendance",
+        "query_attendance",
         "export_excel",
         "export_pdf",
+        "start_export",
+        "export_status",
+        "download_export",
         "clear_attendance",
     )
     if request.endpoint in open_routes or request.endpoint is None:
@@ -355,215 +856,64 @@ LOGIN_TEMPLATE = """
 # --- Exports ---
 @app.get("/export/excel")
 def export_excel():
+    spec = ExportSpec.from_args(request.args)
     # Try to generate a real XLSX; if openpyxl is missing, fall back to CSV
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment
-        import io
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Attendance"
-
-        # Detect filters
-        department = (request.args.get("department") or "").strip()
-        start_date = (request.args.get("startDate") or "").strip()
-        end_date = (request.args.get("endDate") or "").strip()
-        is_single_class = bool(department and department.lower() != "all")
-        is_single_date = bool(start_date and start_date == end_date)
-
-        # Build headers conditionally
-        headers = ["Roll", "Name"]
-        if not is_single_class:
-            headers.append("Class")
-        if not is_single_date:
-            headers.append("Date")
-        headers.extend(["Walk-In Time", "Walk-Out Time", "Status"])
-
-        # Standalone info box above the header (merged single cell with border and wrapping)
-        info_parts = []
-        if is_single_class:
-            info_parts.append(f"Class: {department}")
-        if is_single_date:
-            info_parts.append(f"Date: {start_date}")
-        info_text = "\n".join(info_parts)
-        if info_text:
-            total_cols = len(headers)
-            ws.append([info_text])
-            r = ws.max_row
-            ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=total_cols)
-            try:
-                from openpyxl.styles import Border, Side
-                thin = Side(style="thin")
-                box_border = Border(left=thin, right=thin, top=thin, bottom=thin)
-            except Exception:
-                box_border = None
-            cell = ws.cell(row=r, column=1)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-            if box_border:
-                cell.border = box_border
-            longest = max((len(p) for p in info_parts), default=0)
-            approx_lines = max(1, len(info_parts) + longest // 40)
-            ws.row_dimensions[r].height = 18 * approx_lines
-
-        ws.append(headers)
-        bold = Font(bold=True)
-        header_row = ws.max_row
-        total_cols = len(headers)
-        for idx in range(1, total_cols + 1):
-            ws.cell(row=header_row, column=idx).font = bold
-
-        with sqlite3.connect(DB_PATH) as conn:
-            cur = conn.cursor()
-            # Apply optional filters from query string
-            clauses = []
-            params = []
-            department = (request.args.get("department") or "").strip()
-            start_date = (request.args.get("startDate") or "").strip()
-            end_date = (request.args.get("endDate") or "").strip()
-
-            if department and department.lower() != "all":
-                clauses.append("(LOWER(class) LIKE ? OR LOWER(section) LIKE ?)")
-                like = f"%{department.lower()}%"
-                params.extend([like, like])
-            if start_date:
-                clauses.append("date >= ?")
-                params.append(start_date)
-            if end_date:
-                clauses.append("date <= ?")
-                params.append(end_date)
-
-            where_sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
-            sql = (
-                "SELECT barcode, name, section, class, date, in_time, out_time, status FROM attendance"
-                + where_sql + " ORDER BY id ASC"
-            )
-            cur.execute(sql, params)
-            for r in cur.fetchall():
-                row = [
-                    r[0] or "",
-                    r[1] or "",
-                ]
-                if not is_single_class:
-                    row.append(r[3] or "")
-                if not is_single_date:
-                    row.append(_fmt_date_display(r[4]) or "")
-                row.extend([
-                    r[5] or "",
-                    (r[6] or "—"),
-                    r[7] or "",
-                ])
-                ws.append(row)
-
-        # Formatting: freeze header, wrap, auto-width based on header+data only
-        from openpyxl.utils import get_column_letter
-        ws.freeze_panes = f"A{header_row + 1}"
-        last_row = ws.max_row
-        for col_idx in range(1, total_cols + 1):
-            max_len = 0
-            for row in ws.iter_rows(min_row=header_row, max_row=last_row, min_col=col_idx, max_col=col_idx):
-                cell = row[0]
-                cell.alignment = Alignment(wrap_text=True, vertical="top")
-                value = "" if cell.value is None else str(cell.value)
-                if len(value) > max_len:
-                    max_len = len(value)
-            width = max(12, min(60, int(max_len * 1.2)))
-            ws.column_dimensions[get_column_letter(col_idx)].width = width
-
-        bio = io.BytesIO()
-        wb.save(bio)
-        data_bytes = bio.getvalue()
-        # Safety check: XLSX should be a ZIP file starting with 'PK' signature
-        if not data_bytes or not data_bytes.startswith(b"PK"):
-            raise RuntimeError("Generated XLSX failed integrity check; falling back to CSV")
-        bio.seek(0)
-        return send_file(
-            bio,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            as_attachment=True,
-            download_name="attendance.xlsx",
-        )
+        return _export_xlsx(spec)
     except Exception:
-        import io, csv
-        output = io.StringIO()
-        writer = csv.writer(output)
-        department = (request.args.get("department") or "").strip()
-        start_date = (request.args.get("startDate") or "").strip()
-        end_date = (request.args.get("endDate") or "").strip()
-        is_single_class = bool(department and department.lower() != "all")
-        is_single_date = bool(start_date and start_date == end_date)
-
-        if is_single_class:
-            writer.writerow([f"Class: {department}"])
-        if is_single_date:
-            writer.writerow([f"Date: {start_date}"])
-
-        headers = ["Roll", "Name"]
-        if not is_single_class:
-            headers.append("Class")
-        if not is_single_date:
-            headers.append("Date")
-        headers.extend(["Walk-In Time", "Walk-Out Time", "Status"])
-        writer.writerow(headers)
-        with sqlite3.connect(DB_PATH) as conn:
-            cur = conn.cursor()
-            # Apply optional filters from query string
-            clauses = []
-            params = []
-            department = (request.args.get("department") or "").strip()
-            start_date = (request.args.get("startDate") or "").strip()
-            end_date = (request.args.get("endDate") or "").strip()
-
-            if department and department.lower() != "all":
-                clauses.append("(LOWER(class) LIKE ? OR LOWER(section) LIKE ?)")
-                like = f"%{department.lower()}%"
-                params.extend([like, like])
-            if start_date:
-                clauses.append("date >= ?")
-                params.append(start_date)
-            if end_date:
-                clauses.append("date <= ?")
-                params.append(end_date)
-
-            where_sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
-            sql = (
-                "SELECT barcode, name, section, class, date, in_time, out_time, status FROM attendance"
-                + where_sql + " ORDER BY id ASC"
-            )
-            cur.execute(sql, params)
-            for r in cur.fetchall():
-                row = [
-                    r[0] or "",
-                    r[1] or "",
-                ]
-                if not is_single_class:
-                    row.append(r[3] or "")
-                if not is_single_date:
-                    row.append(r[4] or "")
-                row.extend([
-                    r[5] or "",
-                    (r[6] or "—"),
-                    r[7] or "",
-                ])
-                writer.writerow(row)
-        data = output.getvalue().encode("utf-8-sig")
-        mem = io.BytesIO(data)
-        mem.seek(0)
-        return send_file(
-            mem,
-            mimetype="text/csv; charset=utf-8",
-            as_attachment=True,
-            download_name="attendance.csv",
-        )
+        return _export_csv(spec)
+
+
+def _export_xlsx(spec: ExportSpec):
+    import tempfile
+    from exports import write_xlsx
+
+    tmp = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
+    tmp.close()
+    try:
+        with db.get_connection() as conn:
+            write_xlsx(conn, spec, tmp.name)
+        size = os.path.getsize(tmp.name)
+    except Exception:
+        os.remove(tmp.name)
+        raise
+
+    def stream():
+        try:
+            with open(tmp.name, "rb") as f:
+                while chunk := f.read(64 * 1024):
+                    yield chunk
+        finally:
+            os.remove(tmp.name)
+
+    return Response(
+        stream(),
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Disposition": "attachment; filename=attendance.xlsx",
+            "Content-Length": str(size),
+        },
+    )
+
+
+def _export_csv(spec: ExportSpec):
+    from exports import iter_csv
+
+    def generate():
+        with db.get_connection() as conn:
+            yield from iter_csv(conn, spec)
+
+    return Response(
+        generate(),
+        mimetype="text/csv; charset=utf-8",
+        headers={"Content-Disposition": "attachment; filename=attendance.csv"},
+    )
 
 
 @app.get("/export/pdf")
 def export_pdf():
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.units import cm
+        import reportlab  # noqa: F401
     except Exception:
         return jsonify({
             "success": False,
@@ -572,190 +922,11 @@ def export_pdf():
         }), 501
 
     import io
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # Margins
-    left_margin = 1.5*cm
-    right_margin = 1.5*cm
-
-    # Header with logo + college title
-    from reportlab.lib.utils import ImageReader
-    import os as _os
-    logo_path = _os.path.join(BASE_DIR, "static", "logo.jpg")
-
-    def draw_header() -> float:
-        top_y = height - 1.2*cm
-        logo_w = 1.8*cm
-        logo_h = 1.8*cm
-        has_logo = _os.path.exists(logo_path)
-        if has_logo:
-            try:
-                c.drawImage(logo_path, left_margin, top_y - logo_h, width=logo_w, height=logo_h, preserveAspectRatio=True, mask='auto')
-            except Exception:
-                has_logo = False
-        text_x = left_margin + (logo_w if has_logo else 0) + 0.5*cm
-        # Title
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(text_x, top_y - 0.2*cm, "Dr. B. B. Hegde First Grade College, Kundapura")
-        # Subtitle
-        c.setFont("Helvetica", 10)
-        c.drawString(text_x, top_y - 0.2*cm - 0.7*cm, "A Unit of Coondapur Education Society (R)")
-        # underline
-        line_y = top_y - logo_h - 0.25*cm
-        c.setLineWidth(0.5)
-        c.line(left_margin, line_y, width - right_margin, line_y)
-        # Optional report title below (centered)
-        c.setFont("Helvetica-Bold", 12)
-        c.drawCentredString(width / 2, line_y - 0.9*cm, "Library Attendance Report")
-        return line_y - 1.1*cm
-
-    top_start = draw_header()
-    bottom_margin = 2*cm
-    usable_width = width - left_margin - right_margin
-
-    x0 = left_margin
-    y = top_start
-    row_height = 0.65*cm
-
-    # Detect filters to conditionally show Class/Date and draw info box
-    department = (request.args.get("department") or "").strip()
-    start_date = (request.args.get("startDate") or "").strip()
-    end_date = (request.args.get("endDate") or "").strip()
-    is_single_class = bool(department and department.lower() != "all")
-    is_single_date = bool(start_date and start_date == end_date)
-
-    headers = ["Roll", "Name"]
-    if not is_single_class:
-        headers.append("Class")
-    if not is_single_date:
-        headers.append("Date")
-    headers.extend(["In", "Out", "Status"])
-
-    def draw_row(values, is_header=False):
-        nonlocal y
-        # Draw background for header
-        if is_header:
-            c.setLineWidth(1)
-            c.rect(x0, y - row_height, total_cols_width, row_height, stroke=1, fill=0)
-            c.setFont("Helvetica-Bold", 9)
-        else:
-            c.setLineWidth(0.5)
-            c.rect(x0, y - row_height, total_cols_width, row_height, stroke=1, fill=0)
-            c.setFont("Helvetica", 9)
-
-        # Vertical lines and cell text
-        x = x0
-        for i, (text, cw) in enumerate(zip(values, col_widths)):
-            # Cell box
-            if i > 0:
-                c.line(x, y - row_height, x, y)
-            # Text clipped to cell
-            clip = str(text or "")
-            # Simple clip: reduce until it fits
-            max_chars = int(cw / 5.5)  # heuristic width per char
-            if len(clip) > max_chars:
-                clip = clip[:max_chars-1] + "…"
-            c.drawString(x + 2, y - row_height + 2, clip)
-            x += cw
-
-        y -= row_height
-
-    # Compute column widths now that we know which headers are present
-    if not is_single_class and not is_single_date:
-        #            Roll  Name  Class Date  In   Out  Status
-        col_widths_cm = [3.0, 7.0, 4.8, 3.0, 2.5, 2.5, 3.0]
-    elif is_single_class and not is_single_date:
-        col_widths_cm = [3.0, 8.5, 3.5, 2.5, 2.5, 3.0]  # no Class column
-    elif not is_single_class and is_single_date:
-        col_widths_cm = [3.0, 8.5, 4.8, 2.5, 2.5, 3.0]  # no Date column, wider Class
-    else:
-        col_widths_cm = [3.0, 10.0, 2.8, 2.8, 3.0]  # no Class, no Date
-    col_widths = [w*cm for w in col_widths_cm]
-    total_cols_width = sum(col_widths)
-    if total_cols_width > usable_width:
-        scale = usable_width / total_cols_width
-        col_widths = [w*scale for w in col_widths]
-        total_cols_width = sum(col_widths)
-
-    # Optional info box (separate bordered rectangle with wrapped text)
-    if is_single_class or is_single_date:
-        info_lines = []
-        if is_single_class:
-            info_lines.append(f"Class: {department}")
-        if is_single_date:
-            info_lines.append(f"Date: {start_date}")
-        info_text = "\n".join(info_lines)
-        # Box geometry
-        box_height = max(1.0*cm, 0.6*cm * len(info_lines) + 0.4*cm)
-        c.setLineWidth(0.8)
-        c.rect(x0, y - box_height, total_cols_width, box_height, stroke=1, fill=0)
-        c.setFont("Helvetica-Bold", 10)
-        text_y = y - 0.35*cm
-        for line in info_lines:
-            c.drawString(x0 + 0.2*cm, text_y, line)
-            text_y -= 0.6*cm
-        y -= (box_height + 0.25*cm)
-
-    # Header row
-    draw_row(headers, is_header=True)
-
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        # Apply optional filters from query string
-        clauses = []
-        params = []
-        department = (request.args.get("department") or "").strip()
-        start_date = (request.args.get("startDate") or "").strip()
-        end_date = (request.args.get("endDate") or "").strip()
-
-        if department and department.lower() != "all":
-            clauses.append("(LOWER(class) LIKE ? OR LOWER(section) LIKE ?)")
-            like = f"%{department.lower()}%"
-            params.extend([like, like])
-        if start_date:
-            clauses.append("date >= ?")
-            params.append(start_date)
-        if end_date:
-            clauses.append("date <= ?")
-            params.append(end_date)
-
-        where_sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
-        sql = (
-            "SELECT barcode, name, section, class, date, in_time, out_time, status FROM attendance"
-            + where_sql + " ORDER BY id ASC"
-        )
-        cur.execute(sql, params)
-        for r in cur.fetchall():
-            # Build row conditionally (omit repeated Class/Date)
-            row = [
-                str(r[0] or ""), str(r[1] or ""),
-            ]
-            if not is_single_class:
-                row.append(str(r[3] or ""))
-            if not is_single_date:
-                row.append(_fmt_date_display(str(r[4] or "")))
-            row.extend([
-                str(r[5] or ""), str(r[6] or "—"), str(r[7] or "")
-            ])
-            # New page if needed
-            if y - row_height < bottom_margin:
-                c.showPage()
-                c.setFont("Helvetica", 9)
-                # redraw header on each new page
-                new_top = draw_header()
-                y = new_top
-                if is_single_class:
-                    draw_row([f"Class: {department}"] + [""] * (len(headers) - 1))
-                if is_single_date:
-                    draw_row([f"Date: {start_date}"] + [""] * (len(headers) - 1))
-                draw_row(headers, is_header=True)
-            draw_row(row)
-
-    c.showPage()
-    c.save()
+    from exports import write_pdf
 
+    buffer = io.BytesIO()
+    with db.get_connection() as conn:
+        write_pdf(conn, ExportSpec.from_args(request.args), buffer)
     buffer.seek(0)
     return send_file(
         buffer,
@@ -765,8 +936,86 @@ def export_pdf():
     )
 
 
+# --- Background export jobs ---
+# Exports render in worker processes; results are cached per data version.
+def _notify_export(job: dict):
+    socketio.emit("export_progress", _job_json(job), to=f"export:{job['id']}")
+
+
+export_jobs = ExportJobs(_notify_export)
+
+
+def _job_json(job: dict) -> dict:
+    out = {k: job[k] for k in ("id", "format", "status", "progress", "error", "cached")}
+    if job["status"] == "done":
+        out["download"] = f"/api/exports/{job['id']}/download"
+    return out
 
-_load_students()
-init_db()
-start_barcode_listener_background()
-socketio.run(app, host="0.0.0.0", port=5001)
\ No newline at end of file
+
+@app.post("/api/exports")
+def start_export():
+    """Queue an export; ``format`` is "excel" (default) or "pdf"."""
+    fmt = (request.args.get("format") or "excel").lower()
+    if fmt not in ("excel", "pdf"):
+        return jsonify({"success": False, "error": f"Unknown export format: {fmt}"}), 400
+    if fmt == "pdf":
+        try:
+            import reportlab  # noqa: F401
+        except Exception:
+            return jsonify({
+                "success": False,
+                "error": "PDF export not configured. Install reportlab or use CSV export.",
+                "hint": "pip install reportlab"
+            }), 501
+    try:
+        _flush_writes()
+    except RuntimeError as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+    job = export_jobs.submit(fmt, ExportSpec.from_args(request.args), _committed_version)
+    return jsonify(_job_json(job)), 202
+
+
+@app.get("/api/exports/<job_id>")
+def export_status(job_id):
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown export job"}), 404
+    return jsonify(_job_json(job))
+
+
+@app.get("/api/exports/<job_id>/download")
+def download_export(job_id):
+    job = export_jobs.get(job_id)
+    if job is None or job["status"] != "done" or not os.path.exists(job["file"]):
+        return jsonify({"success": False, "error": "Export not ready"}), 404
+    ext = os.path.splitext(job["file"])[1]
+    return send_file(job["file"], mimetype=MIMETYPES[ext], as_attachment=True, download_name="attendance" + ext)
+
+
+@socketio.on("watch_export")
+def on_watch_export(data):
+    """Receive export_progress events for one job; replies with its current state."""
+    job_id = (data or {}).get("job_id") if isinstance(data, dict) else None
+    job = export_jobs.get(job_id) if job_id else None
+    if job is None:
+        return {"error": "Unknown export job"}
+    join_room(f"export:{job_id}")
+    return _job_json(job)
+
+
+def main():
+    roster.load()
+    roster.start_watcher()
+    init_db()
+    start_write_behind()
+    install_shutdown_handlers()
+    broadcaster.start()
+    archive.start_scheduler(run_maintenance)
+    start_barcode_listener_background()
+    socketio.run(app, host="0.0.0.0", port=5001)
+
+
+# Export workers are spawned processes that re-import this module,
+# so the server must only start when run as a script.
+if __name__ == "__main__":
+    main()
\ No newline at end of file
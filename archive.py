@@ -0,0 +1,229 @@
+import glob
+import itertools
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+from urllib.parse import quote
+
+import db
+
+# Archive files live next to the database: archive/attendance-<term>.db
+ARCHIVE_DIRNAME = "archive"
+# Months a term starts in, ascending; each term runs until the next one starts
+TERM_START_MONTHS = (1, 7)
+# Local hour the nightly archive + compaction runs at
+MAINTENANCE_HOUR = 3
+# VACUUM the live database once this fraction of its pages is free
+VACUUM_FREE_RATIO = 0.2
+
+# Explicit column list: older databases have their columns in a different order
+ARCHIVE_COLUMNS = "id, barcode, name, section, section_id, class, date, in_time, out_time, status, version"
+
+_TERM_FILE = re.compile(r"attendance-(\d{4})-(\d+)\.db$")
+# Suffix making each read-only ATTACH alias unique: greenlets sharing one
+# connection may iterate overlapping partitions at the same time
+_attach_ids = itertools.count(1)
+# Read-only aliases some partitions() call is still using; any other
+# archive_* attach is left over from a DETACH that failed and is retried
+_active_aliases: set[str] = set()
+
+
+# --- Terms ---
+def term_of(date_str: str) -> str:
+    """The term a YYYY-MM-DD date falls in, e.g. "2025-2"."""
+    year, month = int(date_str[:4]), int(date_str[5:7])
+    index = sum(1 for m in TERM_START_MONTHS if m <= month)
+    if index == 0:  # before the first start month: last term of the previous year
+        return f"{year - 1}-{len(TERM_START_MONTHS)}"
+    return f"{year}-{index}"
+
+
+def term_bounds(term: str) -> tuple[str, str]:
+    """(first date, first date of the next term) of ``term``."""
+    year, index = (int(p) for p in term.split("-"))
+    start = f"{year}-{TERM_START_MONTHS[index - 1]:02d}-01"
+    if index < len(TERM_START_MONTHS):
+        end = f"{year}-{TERM_START_MONTHS[index]:02d}-01"
+    else:
+        end = f"{year + 1}-{TERM_START_MONTHS[0]:02d}-01"
+    return start, end
+
+
+def _term_key(term: str) -> tuple[int, int]:
+    year, index = term.split("-")
+    return int(year), int(index)
+
+
+def archive_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db.DB_PATH)), ARCHIVE_DIRNAME)
+
+
+def archive_path(term: str) -> str:
+    return os.path.join(archive_dir(), f"attendance-{term}.db")
+
+
+def archived_terms() -> list[str]:
+    """Terms with an archive file, oldest first."""
+    terms = []
+    for path in glob.glob(os.path.join(archive_dir(), "attendance-*.db")):
+        m = _TERM_FILE.search(path)
+        if m:
+            terms.append(f"{m.group(1)}-{m.group(2)}")
+    return sorted(terms, key=_term_key)
+
+
+# --- Reading across partitions ---
+def partitions(conn: sqlite3.Connection, start_date: str = "", end_date: str = ""):
+    """Yield the attendance tables holding rows between two dates.
+
+    Archived terms overlapping the range are attached read-only one at a
+    time and detached once the caller moves on; the live table is always
+    included (it keeps visits still open from earlier terms). Finish with
+    each table's cursor before asking for the next one.
+    """
+    tables = []
+    for term in archived_terms():
+        start, end = term_bounds(term)
+        if (not end_date or start <= end_date) and (not start_date or end > start_date):
+            tables.append(term)
+    tables.append(None)
+    _detach_stale(conn)
+
+    for term in tables:
+        if term is None:
+            yield "attendance"
+            continue
+        alias = f"archive_{term.replace('-', '_')}_{next(_attach_ids)}"
+        uri = "file:" + quote(archive_path(term)) + "?mode=ro"
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (uri,))
+        _active_aliases.add(alias)
+        try:
+            yield f"{alias}.attendance"
+        finally:
+            _active_aliases.discard(alias)
+            _detach(conn, alias)
+
+
+def _detach(conn: sqlite3.Connection, alias: str):
+    # Never raise from partitions()' finally: that would replace the caller's
+    # exception (or GeneratorExit). A failed DETACH is retried on the next call.
+    try:
+        conn.execute(f"DETACH DATABASE {alias}")
+    except sqlite3.Error as e:
+        print(f"Could not detach {alias} yet: {e}")
+
+
+def _detach_stale(conn: sqlite3.Connection):
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        alias = row[1]
+        if alias.startswith("archive_") and alias != "archive_write" and alias not in _active_aliases:
+            _detach(conn, alias)
+
+
+# --- Archiving ---
+def _create_archive_schema(conn: sqlite3.Connection, alias: str):
+    # Read-only attaches can't open a WAL file, so archives use a rollback journal
+    conn.execute(f"PRAGMA {alias}.journal_mode=DELETE")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {alias}.attendance (
+            id INTEGER PRIMARY KEY,
+            barcode TEXT,
+            name TEXT,
+            section TEXT,
+            section_id INTEGER,
+            class TEXT,
+            date TEXT,
+            in_time TEXT,
+            out_time TEXT,
+            status TEXT,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_attendance_date_status ON attendance(date, status)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_attendance_section ON attendance(section_id, id)")
+
+
+def archive_closed_terms(conn: sqlite3.Connection, today: str | None = None) -> dict[str, int]:
+    """Move finished visits of past terms into their archive files.
+
+    Rows still "In Library" stay in the live table so they can be closed
+    by a walk-out. Returns {term: rows moved}. The caller must keep other
+    writers off the attendance table while this runs.
+    """
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    current_start = term_bounds(term_of(today))[0]
+    terms = set()
+    for (month,) in conn.execute(
+        "SELECT DISTINCT substr(date, 1, 7) FROM attendance WHERE date < ? AND status != 'In Library'",
+        (current_start,),
+    ):
+        try:
+            terms.add(term_of(month + "-01"))
+        except ValueError:
+            print(f"Skipping attendance rows with unreadable date {month!r}")
+
+    moved = {}
+    if terms:
+        os.makedirs(archive_dir(), exist_ok=True)
+    for term in sorted(terms, key=_term_key):
+        start, end = term_bounds(term)
+        where = "date >= ? AND date < ? AND status != 'In Library'"
+        conn.execute("ATTACH DATABASE ? AS archive_write", (archive_path(term),))
+        try:
+            _create_archive_schema(conn, "archive_write")
+            # Copy, commit, then delete: after a crash in between, the next run's
+            # INSERT OR REPLACE overwrites the copies and finishes the move.
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO archive_write.attendance ({ARCHIVE_COLUMNS}) "
+                    f"SELECT {ARCHIVE_COLUMNS} FROM main.attendance WHERE {where}",
+                    (start, end),
+                )
+            with conn:
+                moved[term] = conn.execute(f"DELETE FROM main.attendance WHERE {where}", (start, end)).rowcount
+            conn.execute("ANALYZE archive_write")
+        finally:
+            conn.execute("DETACH DATABASE archive_write")
+        print(f"Archived {moved[term]} attendance rows from term {term}")
+    return moved
+
+
+def compact(conn: sqlite3.Connection) -> dict:
+    """Checkpoint the WAL, VACUUM if enough pages are free, refresh statistics."""
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    vacuumed = bool(pages) and free / pages >= VACUUM_FREE_RATIO
+    if vacuumed:
+        conn.execute("VACUUM")
+    conn.execute("ANALYZE")
+    return {"pages": pages, "free_pages": free, "vacuumed": vacuumed}
+
+
+# --- Scheduling ---
+def _seconds_until(hour: int) -> float:
+    now = datetime.now()
+    run_at = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+def start_scheduler(run: Callable[[], object], hour: int = MAINTENANCE_HOUR) -> threading.Thread:
+    """Call ``run`` every day at ``hour`` o'clock from a daemon thread."""
+
+    def loop():
+        while True:
+            time.sleep(_seconds_until(hour))
+            try:
+                run()
+            except Exception as e:
+                print(f"Database maintenance failed: {e}")
+
+    thread = threading.Thread(target=loop, name="db-maintenance", daemon=True)
+    thread.start()
+    return thread
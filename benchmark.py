@@ -0,0 +1,181 @@
+"""End-to-end load test on simulated scanners; no USB hardware needed.
+
+    python benchmark.py --rate 200 --duration 30 --clients 10 --pollers 5
+
+Fake scanners type random roster barcodes into the real pipeline (HID
+decode, scan queue, on_barcode, SQLite, Socket.IO broadcast) while
+dashboard pollers, Socket.IO clients and Excel exports run alongside.
+Runs against a temporary copy of attendance.db.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+
+import db
+import fake_scanner
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+
+class Timings:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples[stage].append(seconds * 1000)
+
+    def report(self):
+        print(f"{'stage':<28}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for stage, values in self.samples.items():
+            print(
+                f"{stage:<28}{len(values):>8}{percentile(values, 50):>10.2f}"
+                f"{percentile(values, 99):>10.2f}{max(values):>10.2f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=200, help="total scans per minute")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--scanners", type=int, default=2, help="simulated scanners (at most len(SCANNERS))")
+    parser.add_argument("--clients", type=int, default=10, help="connected Socket.IO clients")
+    parser.add_argument("--pollers", type=int, default=5, help="dashboards polling /api/attendance")
+    parser.add_argument("--poll-interval", type=float, default=3.0)
+    parser.add_argument("--export-every", type=float, default=10.0, help="seconds between exports (0 = none)")
+    parser.add_argument("--debounce", type=float, default=0.0, help="SCAN_DEBOUNCE_SECONDS for the run")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # --- Isolated database ---
+    tmp = tempfile.mkdtemp(prefix="attendance_bench_")
+    db.DB_PATH = os.path.join(tmp, "attendance.db")
+    shutil.copy(os.path.join(db.BASE_DIR, "attendance.db"), db.DB_PATH)
+
+    import app
+    import both_test as scanner
+
+    app.roster.load()
+    app.init_db()
+    app.start_write_behind()
+    app.broadcaster.start()
+    app._debouncer.window = args.debounce
+
+    timings = Timings()
+    enter_times = defaultdict(deque)  # barcode -> times its Enter report was read
+    published = {}  # version -> Enter time of that scan
+
+    # --- Simulated scanners ---
+    barcodes = fake_scanner.roster_barcodes()
+    configs = scanner.SCANNERS[: args.scanners]
+    devices = [
+        fake_scanner.FakeScanner(
+            s["vendor"], s["product"],
+            fake_scanner.random_script(barcodes, seed=args.seed + i),
+            rate=args.rate / len(configs), jitter=0.5,
+        )
+        for i, s in enumerate(configs)
+    ]
+    fake_scanner.FakeBus(devices).install()
+
+    # Stamp each stage around the real callbacks
+    def on_barcode(code, gate=None):
+        start = time.monotonic()
+        for dev in devices:
+            while dev.scanned:
+                c, t = dev.scanned.pop(0)
+                enter_times[c].append(t)
+        queue = enter_times.get(code)
+        entered = queue.popleft() if queue else start
+        timings.add("hid -> on_barcode", start - entered)
+        version = app._data_version
+        app.on_barcode(code, gate)
+        timings.add("on_barcode", time.monotonic() - start)
+        if app._data_version != version:
+            published[app._data_version] = entered
+
+    real_emit = app.socketio.emit
+
+    def emit(event, data=None, **kwargs):
+        start = time.monotonic()
+        real_emit(event, data, **kwargs)
+        if event == "scans_batch" and data:
+            timings.add("broadcast emit", time.monotonic() - start)
+            for s in data["scans"]:
+                entered = published.pop(s["row"]["version"], None)
+                if entered is not None:
+                    timings.add("scan -> clients", time.monotonic() - entered)
+
+    app.socketio.emit = emit
+
+    from scanner_manager import ScannerManager
+
+    manager = ScannerManager(scanners=configs, poll_interval=0.5)
+    threading.Thread(target=manager.run, args=(on_barcode,), daemon=True).start()
+
+    # --- Dashboards ---
+    clients = [app.socketio.test_client(app.app) for _ in range(args.clients)]
+    stop = threading.Event()
+
+    def drain_clients():
+        while not stop.is_set():
+            for c in clients:
+                c.get_received()
+            stop.wait(0.05)
+
+    def poller():
+        http = app.app.test_client()
+        version = None
+        while not stop.is_set():
+            url = "/api/attendance" if version is None else f"/api/attendance?since_version={version}"
+            start = time.monotonic()
+            data = http.get(url).get_json()
+            timings.add("poll /api/attendance", time.monotonic() - start)
+            version = data["version"]
+            stop.wait(args.poll_interval)
+
+    def exporter():
+        http = app.app.test_client()
+        while not stop.wait(args.export_every):
+            start = time.monotonic()
+            http.get("/export/excel").get_data()
+            timings.add("export excel", time.monotonic() - start)
+
+    workers = [threading.Thread(target=drain_clients, daemon=True)]
+    workers += [threading.Thread(target=poller, daemon=True) for _ in range(args.pollers)]
+    if args.export_every > 0:
+        workers.append(threading.Thread(target=exporter, daemon=True))
+    for w in workers:
+        w.start()
+
+    print(f"Running {args.duration:.0f}s at {args.rate:.0f} scans/min on {len(devices)} scanner(s), "
+          f"{args.clients} socket clients, {args.pollers} pollers")
+    started = time.monotonic()
+    time.sleep(args.duration)
+    stop.set()
+    manager.stop()
+    elapsed = time.monotonic() - started
+    if app._write_behind is not None:
+        app._write_behind.flush()
+    time.sleep(app.BROADCAST_FLUSH_MS / 1000 * 2)
+
+    handled = len(timings.samples["on_barcode"])
+    print(f"\nScans handled: {handled} in {elapsed:.1f}s = {handled / elapsed * 60:.0f}/min "
+          f"(debounced: {app._debouncer.dropped})")
+    print(f"Scan queue: {scanner.get_scan_stats()}\n")
+    timings.report()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
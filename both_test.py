@@ -1,15 +1,26 @@
+import ctypes.util
+import os
 import usb.core
 import usb.util
 import usb.backend.libusb1
 import threading
+import queue
 import sys
 import time
+from collections import namedtuple
 
-# ✅ Load backend explicitly
+import metrics
+
+# ✅ Load backend explicitly (the bundled Windows DLL if present, else the system libusb)
+LIBUSB_PATH = "C:/libusb/libusb-1.0.dll"
 backend = usb.backend.libusb1.get_backend(
-    find_library=lambda x: "C:/libusb/libusb-1.0.dll"
+    find_library=lambda x: LIBUSB_PATH if os.path.exists(LIBUSB_PATH) else ctypes.util.find_library(x)
 )
 
+# ✅ Optional replacement for USB lookup: callable(vendor, product) -> device or None.
+# fake_scanner.FakeBus.find plugs simulated scanners in here.
+device_source = None
+
 # ✅ Scanner configurations
 SCANNERS = [
     {"vendor": 0x2DD6, "product": 0x2701, "prefix": "scan1"},  # main scanner
@@ -19,6 +30,15 @@ SCANNERS = [
 stop_flag = False
 active_scanner = None  # which scanner is currently active
 
+# ✅ Scan events flow from the reader threads to one dispatcher through a bounded queue
+ScanEvent = namedtuple("ScanEvent", ["prefix", "code", "timestamp"])
+
+SCAN_QUEUE_SIZE = 256
+MIN_BARCODE_LENGTH = 3
+scan_queue = queue.Queue(maxsize=SCAN_QUEUE_SIZE)
+scan_stats = {"enqueued": 0, "dispatched": 0, "dropped": 0, "max_depth": 0, "errors": 0}
+_stats_lock = threading.Lock()
+
 # ✅ HID keycode maps
 KEYMAP = {
     4: "a", 5: "b", 6: "c", 7: "d", 8: "e", 9: "f", 10: "g", 11: "h",
@@ -43,22 +63,165 @@ SHIFT_KEYMAP = {
 }
 
 
+# ✅ Precomputed decode table: HID_TABLE[keycode | shift << 8] -> ASCII byte (0 = no character)
+SHIFT_MASK = 0x22  # left (0x02) or right (0x20) shift in the modifier byte
+CAPS_LOCK = 57
+ENTER = ord("\n")
+
+HID_TABLE = bytearray(512)
+for _code, _ch in KEYMAP.items():
+    HID_TABLE[_code] = HID_TABLE[256 + _code] = ord(_ch)  # Enter/space are unaffected by shift
+for _code, _ch in SHIFT_KEYMAP.items():
+    HID_TABLE[256 + _code] = ord(_ch)
+
+
 def decode_hid(data):
     """Decode HID report"""
     if not data or data[2] == 0:
         return None
-    keycode = data[2]
-    shift = data[0] in (2, 32)
-    return SHIFT_KEYMAP.get(keycode) if shift else KEYMAP.get(keycode)
+    byte = HID_TABLE[data[2] | (256 if data[0] & SHIFT_MASK else 0)]
+    return chr(byte) if byte else None
+
+
+class HidDecoder:
+    """Per-scanner decoder for boot-keyboard HID reports.
+
+    Every report carries up to six pressed keys (bytes 2-7). A key counts
+    once, in the report where it first appears, so scanners that pack
+    several characters per report or hold keys across reports decode
+    correctly. Characters accumulate in a preallocated bytearray.
+    """
+
+    __slots__ = ("buf", "length", "prev", "caps")
+
+    def __init__(self, capacity=128):
+        self.buf = bytearray(capacity)
+        self.length = 0
+        self.prev = bytearray(6)  # keys held in the previous report
+        self.caps = False
+
+    def feed(self, data, emit):
+        """Decode one report, calling emit(code) on Enter. Returns True if characters were added."""
+        if not data or len(data) < 3:
+            return False
+        plane = 256 if data[0] & SHIFT_MASK else 0
+        prev = self.prev
+        added = False
+        end = min(len(data), 8)
+        for i in range(2, end):
+            code = data[i]
+            if code == 0 or code in prev:
+                continue
+            if code == CAPS_LOCK:
+                self.caps = not self.caps
+                continue
+            # Caps lock inverts shift for letters only
+            if self.caps and 4 <= code <= 29:
+                byte = HID_TABLE[code | (plane ^ 256)]
+            else:
+                byte = HID_TABLE[code | plane]
+            if not byte:
+                continue
+            if byte == ENTER:
+                if self.length:
+                    emit(self.take())
+                continue
+            if self.length == len(self.buf):
+                self.buf.extend(bytearray(len(self.buf)))
+            self.buf[self.length] = byte
+            self.length += 1
+            added = True
+        for i in range(6):
+            prev[i] = data[i + 2] if i + 2 < end else 0
+        return added
+
+    def take(self):
+        """Return the buffered characters as a string and reset."""
+        code = self.buf[:self.length].decode("ascii")
+        self.length = 0
+        return code
+
+
+def publish_scan(prefix, code):
+    """Queue a finished barcode for the dispatcher (never blocks the reader)."""
+    if active_scanner is not None and prefix != active_scanner:
+        return
+    event = ScanEvent(prefix, code, time.time())
+    try:
+        scan_queue.put_nowait(event)
+    except queue.Full:
+        with _stats_lock:
+            scan_stats["dropped"] += 1
+        return
+    with _stats_lock:
+        scan_stats["enqueued"] += 1
+        depth = scan_queue.qsize()
+        if depth > scan_stats["max_depth"]:
+            scan_stats["max_depth"] = depth
 
 
-def read_scanner(vendor_id, product_id, prefix):
-    """Read data from the USB barcode scanner."""
-    global stop_flag, active_scanner
-    dev = usb.core.find(idVendor=vendor_id, idProduct=product_id, backend=backend)
+def _deliver(event, callback, with_gate=False):
+    if len(event.code) < MIN_BARCODE_LENGTH:
+        return
+    if metrics.ENABLED:
+        metrics.observe("scan_queue_wait", time.time() - event.timestamp)
+    try:
+        if with_gate:
+            callback(event.code, event.prefix)
+        else:
+            callback(event.code)
+    except Exception as e:
+        with _stats_lock:
+            scan_stats["errors"] += 1
+        print(f"{event.prefix}: scan handler failed ({e})")
+    with _stats_lock:
+        scan_stats["dispatched"] += 1
+
+
+def dispatch_scans(callback, with_gate=False):
+    """Deliver queued scans to callback(code) until stop_flag is set.
+
+    With ``with_gate`` the scanner prefix is passed too: callback(code, gate).
+    """
+    while not stop_flag:
+        try:
+            event = scan_queue.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        _deliver(event, callback, with_gate)
+
+
+def drain_scans(callback, with_gate=False):
+    """Deliver whatever is queued right now without waiting."""
+    while True:
+        try:
+            event = scan_queue.get_nowait()
+        except queue.Empty:
+            return
+        _deliver(event, callback, with_gate)
+
+
+def get_scan_stats():
+    """Snapshot of queue depth and throughput counters."""
+    with _stats_lock:
+        stats = dict(scan_stats)
+    stats["depth"] = scan_queue.qsize()
+    return stats
+
+
+def find_device(vendor_id, product_id):
+    """Return the attached USB device with these ids, or None."""
+    if device_source is not None:
+        return device_source(vendor_id, product_id)
+    return usb.core.find(idVendor=vendor_id, idProduct=product_id, backend=backend)
+
+
+def open_scanner(vendor_id, product_id, prefix):
+    """Find and configure a scanner; returns (dev, ep) or None."""
+    dev = find_device(vendor_id, product_id)
     if dev is None:
         print(f"{prefix}: Device not found")
-        return
+        return None
 
     try:
         dev.set_configuration()
@@ -66,7 +229,7 @@ def read_scanner(vendor_id, product_id, prefix):
         intf = cfg[(0, 0)]
     except Exception as e:
         print(f"{prefix}: Could not set configuration ({e})")
-        return
+        return None
 
     ep = usb.util.find_descriptor(
         intf,
@@ -75,33 +238,37 @@ def read_scanner(vendor_id, product_id, prefix):
     )
     if ep is None:
         print(f"{prefix}: No IN endpoint found")
-        return
+        return None
 
     print(f"{prefix}: Ready on endpoint {hex(ep.bEndpointAddress)}")
+    return dev, ep
+
 
-    barcode = ""
+def read_scanner(vendor_id, product_id, prefix):
+    """Read data from the USB barcode scanner."""
+    global stop_flag, active_scanner
+    opened = open_scanner(vendor_id, product_id, prefix)
+    if opened is None:
+        return
+    read_device(*opened, prefix)
+
+
+def read_device(dev, ep, prefix):
+    """Read an opened scanner until it disconnects, errors or stop_flag is set."""
+    decoder = HidDecoder()
+    emit = lambda code: publish_scan(prefix, code)
     last_char_time = time.time()
 
     while not stop_flag:
         try:
             data = dev.read(ep.bEndpointAddress, ep.wMaxPacketSize, timeout=1000)
-            char = decode_hid(data)
-            if char:
-                if char == "\n":
-                    if barcode:
-                        if prefix == active_scanner:
-                            print(f"{prefix}: {barcode}")
-                        barcode = ""
-                else:
-                    barcode += char
-                    last_char_time = time.time()
+            if decoder.feed(data, emit):
+                last_char_time = time.time()
 
         except usb.core.USBError as e:
             if e.errno in (110, 10060):  # timeout
-                if barcode and (time.time() - last_char_time > 0.5):
-                    if prefix == active_scanner:
-                        print(f"{prefix}: {barcode}")
-                    barcode = ""
+                if decoder.length and (time.time() - last_char_time > 0.5):
+                    publish_scan(prefix, decoder.take())
                 continue
             elif e.errno == 19:  # disconnected
                 print(f"{prefix}: Device disconnected")
@@ -111,6 +278,68 @@ def read_scanner(vendor_id, product_id, prefix):
                 break
 
 
+# ✅ Cooperative mode: one loop polls every scanner with short timeouts
+POLL_TIMEOUT_MS = 5  # per-device read timeout in each pass
+FLUSH_GAP_SECONDS = 0.03  # silence after which a partial barcode is complete
+
+
+def _call(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+def poll_scanners(callback, sleep=time.sleep, with_gate=False, blocking=None):
+    """Poll all SCANNERS from the calling (green)thread and deliver scans.
+
+    ``sleep(0)`` is called after every pass so an async server loop
+    (eventlet via socketio.sleep) keeps running between USB reads. Each
+    USB read goes through ``blocking(fn, *args)``; under eventlet pass
+    ``eventlet.tpool.execute`` so the read waits in a real thread instead
+    of stalling the hub.
+    """
+    blocking = blocking or _call
+    readers = []
+    for s in SCANNERS:
+        opened = open_scanner(s["vendor"], s["product"], s["prefix"])
+        if opened is not None:
+            dev, ep = opened
+            # [prefix, dev, endpoint, decoder, emit, time of last char]
+            prefix = s["prefix"]
+            emit = lambda code, prefix=prefix: publish_scan(prefix, code)
+            readers.append([prefix, dev, ep, HidDecoder(), emit, 0.0])
+
+    while not stop_flag and readers:
+        for reader in list(readers):
+            prefix, dev, ep, decoder, emit, last_char_time = reader
+            try:
+                data = blocking(dev.read, ep.bEndpointAddress, ep.wMaxPacketSize, timeout=POLL_TIMEOUT_MS)
+            except usb.core.USBError as e:
+                data = None
+                if e.errno not in (110, 10060):  # not a timeout
+                    print(f"{prefix}: " + ("Device disconnected" if e.errno == 19 else f"USB Error {e}"))
+                    readers.remove(reader)
+                    continue
+
+            now = time.monotonic()
+            if decoder.feed(data, emit):
+                reader[5] = now
+            elif decoder.length and now - last_char_time > FLUSH_GAP_SECONDS:
+                publish_scan(prefix, decoder.take())
+
+        drain_scans(callback, with_gate)
+        sleep(0)
+
+
+def cooperative_listener(callback, sleep=time.sleep, active=None, with_gate=False, blocking=None):
+    """Cooperative counterpart of main_listener (no thread per scanner).
+
+    Every scanner feeds ``callback`` unless ``active`` names just one.
+    """
+    global active_scanner
+    active_scanner = active
+    print(f"✅ Listening to {active or 'all scanners'} (cooperative)")
+    poll_scanners(callback, sleep, with_gate, blocking)
+
+
 # ✅ Direct-run mode for testing
 def main():
     global stop_flag, active_scanner
@@ -129,6 +358,10 @@ def main():
         t.start()
         threads.append(t)
 
+    t = threading.Thread(target=dispatch_scans, args=(lambda code: print(f"{active_scanner}: {code}"),), daemon=True)
+    t.start()
+    threads.append(t)
+
     try:
         while True:
             key = sys.stdin.readline().strip().lower()
@@ -160,40 +393,8 @@ def main_listener(callback):
         t.start()
         threads.append(t)
 
-    # ✅ Intercept print() output to capture barcodes
-    old_print = print
-
-    def custom_print(*args, **kwargs):
-        msg = " ".join(str(a) for a in args).strip()
-
-        # ✅ If this is a scanner data line ("scanX: <barcode>"), suppress console output
-        # and handle it silently below. Otherwise, print as normal.
-        if not msg.startswith(active_scanner + ":"):
-            return old_print(*args, **kwargs)
-
-        # Extract the barcode value (text after the colon)
-        barcode_value = msg.split(":", 1)[1].strip()
-
-        # 🚫 Skip lines that are not valid barcodes
-        if (
-            not barcode_value
-            or "endpoint" in barcode_value.lower()
-            or "device" in barcode_value.lower()
-            or "error" in barcode_value.lower()
-        ):
-            return
-
-        # ✅ Forward only proper student IDs to Flask (console stays silent for scanner lines)
-        if len(barcode_value) >= 3:
-            callback(barcode_value)
-
-    # Replace print globally
-    globals()["print"] = custom_print
-
-    # Keep thread alive
-    while not stop_flag:
-        time.sleep(0.5)
-
+    # ✅ Deliver scans to Flask as they arrive (blocks until stop_flag)
+    dispatch_scans(callback)
 
 
 if __name__ == "__main__":
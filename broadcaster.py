@@ -0,0 +1,133 @@
+import threading
+import time
+from typing import Callable
+
+from flask_socketio import join_room, leave_room
+
+import metrics
+
+ALL_ROOM = "all"
+
+
+def section_room(section: str) -> str:
+    return f"section:{section}"
+
+
+def gate_room(gate: str) -> str:
+    return f"gate:{gate}"
+
+
+class Broadcaster:
+    """Coalesce scan events into one ``scans_batch`` frame per room.
+
+    Scans published between flushes are sent together every
+    ``flush_interval_ms`` with the latest summary, so a burst of scans
+    costs one emit per watched room instead of two emits per scan per
+    client. Clients see everything (room "all") or subscribe to a
+    section or gate room and receive only those scans.
+
+    Each frame carries ``since`` (the version the room's previous frame
+    ended at) and ``version``; a client whose own version is older than
+    ``since`` missed something and should resync.
+    """
+
+    def __init__(
+        self,
+        socketio,
+        summary_fn: Callable[[], dict],
+        flush_interval_ms: int = 150,
+        event: str = "scans_batch",
+    ):
+        self.socketio = socketio
+        self.summary_fn = summary_fn
+        self.flush_interval = flush_interval_ms / 1000
+        self.event = event
+        # (scan, section, gate, version, time published)
+        self._pending: list[tuple[dict, str | None, str | None, int, float]] = []
+        self._dirty = False
+        self._reset: int | None = None  # version the table was cleared at
+        self._version = 0  # newest version published
+        self._room_version: dict[str, int] = {}  # room -> version of its last frame
+        self._lock = threading.Lock()
+        self._members: dict[str, str] = {}  # sid -> room
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            # Green thread under eventlet, regular thread otherwise
+            self._task = self.socketio.start_background_task(self._run)
+
+    def publish(self, scan: dict, version: int, section: str | None = None, gate: str | None = None):
+        with self._lock:
+            self._pending.append((scan, section, gate, version, time.monotonic()))
+            self._version = max(self._version, version)
+            self._dirty = True
+
+    def reset(self, version: int):
+        """Tell every client the table was cleared at ``version``."""
+        with self._lock:
+            self._pending = [p for p in self._pending if p[3] > version]
+            self._reset = version
+            self._version = max(self._version, version)
+            self._dirty = True
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # --- Rooms ---
+    def subscribe(self, sid: str, section: str | None = None, gate: str | None = None) -> str:
+        room = section_room(section) if section else gate_room(gate) if gate else ALL_ROOM
+        with self._lock:
+            old = self._members.get(sid)
+            self._members[sid] = room
+            self._room_version.setdefault(room, self._version)
+        if old == room:
+            return room
+        if old is not None:
+            leave_room(old, sid=sid, namespace="/")
+        join_room(room, sid=sid, namespace="/")
+        return room
+
+    def unsubscribe(self, sid: str):
+        with self._lock:
+            self._members.pop(sid, None)
+
+    # --- Flushing ---
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            pending, self._pending = self._pending, []
+            reset, self._reset = self._reset, None
+            self._dirty = False
+            rooms = set(self._members.values())
+        if metrics.ENABLED:
+            now = time.monotonic()
+            for p in pending:
+                metrics.observe("broadcast_delay", now - p[4])
+        summary = self.summary_fn()
+        for room in rooms:
+            if room == ALL_ROOM:
+                matched = pending
+            elif room.startswith("section:"):
+                name = room[len("section:"):]
+                matched = [p for p in pending if p[1] == name]
+            else:
+                name = room[len("gate:"):]
+                matched = [p for p in pending if p[2] == name]
+            since = reset if reset is not None else self._room_version.get(room, 0)
+            version = max((p[3] for p in matched), default=since)
+            self._room_version[room] = version
+            frame = {"scans": [p[0] for p in matched], "summary": summary, "since": since, "version": version}
+            if reset is not None:
+                frame["reset"] = True
+            with metrics.timer("broadcast_emit"):
+                self.socketio.emit(self.event, frame, to=room)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Broadcast flush failed: {e}")
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import threading
+
+# SQLite database path
+BASE_DIR = os.path.dirname(__file__)
+DB_PATH = os.path.join(BASE_DIR, "attendance.db")
+
+# How long a connection waits on a locked database before raising
+BUSY_TIMEOUT_MS = 5000
+# Compiled statements kept per connection; reused whenever the SQL text repeats
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        # Lets archive files be ATTACHed read-only via file:...?mode=ro
+        uri=True,
+    )
+    # WAL lets readers (exports, dashboard polls) run alongside the scanner's
+    # writes; NORMAL sync is durable across application crashes in WAL mode.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's connection, opening it on first use.
+
+    Use it as ``with get_connection() as conn:`` to commit on success and
+    roll back on error; the connection itself stays open for reuse.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _connect(DB_PATH)
+        _local.conn = conn
+        _local.path = DB_PATH
+    return conn
+
+
+def close_connection():
+    """Close the calling thread's cached connection, if any."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
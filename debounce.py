@@ -0,0 +1,53 @@
+import threading
+import time
+
+
+class ScanDebouncer:
+    """Drop repeat scans of the same barcode within ``window`` seconds.
+
+    Last-seen times are filed into one-second buckets so expired entries
+    are evicted a whole bucket at a time, keeping the cache as small as
+    the number of barcodes scanned within the window.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._last: dict[str, float] = {}
+        self._buckets: dict[int, list[str]] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def accept(self, key: str, now: float | None = None) -> bool:
+        """True if this scan should be processed, False for a repeat."""
+        if self.window <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._evict(now)
+            last = self._last.get(key)
+            if last is not None and now - last < self.window:
+                # Keep the first scan's time so a held/repeated scan can't
+                # stretch the window forever
+                self.dropped += 1
+                return False
+            self._last[key] = now
+            self._buckets.setdefault(int(now), []).append(key)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._last.clear()
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._last)
+
+    def _evict(self, now: float):
+        # Every time filed in a bucket below the cutoff is past the window
+        cutoff = int(now - self.window)
+        for b in [b for b in self._buckets if b < cutoff]:
+            for key in self._buckets.pop(b):
+                # Skip keys that were accepted again into a newer bucket
+                last = self._last.get(key)
+                if last is not None and int(last) == b:
+                    del self._last[key]
@@ -0,0 +1,187 @@
+import atexit
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+import db
+from exports import ExportSpec, count_rows, iter_csv, write_pdf, write_xlsx
+
+# Worker processes rendering exports
+EXPORT_WORKERS = 2
+# Finished files kept for repeat downloads of an unchanged report
+EXPORT_CACHE_SIZE = 16
+# Finished/failed jobs remembered for status lookups
+MAX_JOBS = 200
+
+MIMETYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".csv": "text/csv; charset=utf-8",
+    ".pdf": "application/pdf",
+}
+
+# Set in each worker process; carries (job_id, percent) back to the server
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def render_export(job_id: str, fmt: str, db_path: str, filters: tuple, out_base: str) -> str:
+    """Render one export in a worker process and return the file path.
+
+    ``fmt`` is "excel" or "pdf"; an Excel export falls back to CSV when
+    openpyxl is unavailable or the workbook fails its integrity check.
+    """
+    db.DB_PATH = db_path
+    conn = db.get_connection()
+    spec = ExportSpec(*filters)
+    total = max(1, count_rows(conn, spec))
+    step = max(1, total // 20)
+    reported = 0
+
+    def progress(done: int):
+        nonlocal reported
+        if _progress_queue is not None and done - reported >= step:
+            reported = done
+            _progress_queue.put((job_id, min(99, done * 100 // total)))
+
+    if fmt == "pdf":
+        path = out_base + ".pdf"
+        with open(path + ".part", "wb") as f:
+            write_pdf(conn, spec, f, progress=progress)
+    else:
+        path = out_base + ".xlsx"
+        try:
+            write_xlsx(conn, spec, path + ".part", progress=progress)
+        except Exception:
+            path = out_base + ".csv"
+            with open(path + ".part", "wb") as f:
+                for chunk in iter_csv(conn, spec):
+                    f.write(chunk)
+    os.replace(path + ".part", path)
+    return path
+
+
+class ExportJobs:
+    """Run exports in a process pool and cache the finished files.
+
+    Jobs are keyed by (format, filters, data version): asking again for a
+    report whose rows haven't changed returns the cached file at once,
+    and identical requests in flight share one job. Status changes and
+    progress are reported through ``notify(job)``.
+    """
+
+    def __init__(self, notify: Callable[[dict], None], workers: int = EXPORT_WORKERS, cache_size: int = EXPORT_CACHE_SIZE):
+        self.notify = notify
+        self.workers = workers
+        self.cache_size = cache_size
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._cache: OrderedDict[tuple, str] = OrderedDict()  # key -> file path
+        self._inflight: dict[tuple, str] = {}  # key -> job id
+        self._lock = threading.Lock()
+        self._pool = None
+        self._progress = None
+        self._dir = None
+
+    def _start(self):
+        if self._pool is not None:
+            return
+        # spawn: never fork a server process that is running scanner threads
+        ctx = multiprocessing.get_context("spawn")
+        self._progress = ctx.Queue()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=ctx, initializer=_init_worker, initargs=(self._progress,)
+        )
+        self._dir = tempfile.mkdtemp(prefix="attendance_exports_")
+        threading.Thread(target=self._read_progress, name="export-progress", daemon=True).start()
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._progress.put(None)
+            self._pool = None
+        if self._dir:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+    def submit(self, fmt: str, spec: ExportSpec, version: int) -> dict:
+        filters = (spec.department, spec.start_date, spec.end_date)
+        key = (fmt, *filters, version)
+        with self._lock:
+            job_id = self._inflight.get(key)
+            if job_id in self._jobs:
+                return dict(self._jobs[job_id])
+            self._start()
+            job = {"id": uuid.uuid4().hex, "format": fmt, "status": "queued", "progress": 0, "error": None, "file": None, "cached": False}
+            self._remember(job)
+            path = self._cache.get(key)
+            if path is not None and os.path.exists(path):
+                self._cache.move_to_end(key)
+                job.update(status="done", progress=100, file=path, cached=True)
+                return dict(job)
+            self._inflight[key] = job["id"]
+            out_base = os.path.join(self._dir, hashlib.sha1(repr(key).encode()).hexdigest())
+            future = self._pool.submit(render_export, job["id"], fmt, db.DB_PATH, filters, out_base)
+        future.add_done_callback(lambda f: self._finished(key, job["id"], f))
+        return dict(job)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _remember(self, job: dict):
+        self._jobs[job["id"]] = job
+        while len(self._jobs) > MAX_JOBS:
+            self._jobs.popitem(last=False)
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            snapshot = dict(job)
+        self.notify(snapshot)
+
+    def _finished(self, key: tuple, job_id: str, future):
+        with self._lock:
+            self._inflight.pop(key, None)
+        try:
+            path = future.result()
+        except Exception as e:
+            print(f"Export job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e))
+            return
+        with self._lock:
+            self._cache[key] = path
+            while len(self._cache) > self.cache_size:
+                _, old = self._cache.popitem(last=False)
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        self._update(job_id, status="done", progress=100, file=path)
+
+    def _read_progress(self):
+        q = self._progress
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            job_id, percent = item
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] not in ("queued", "running"):
+                    continue
+            self._update(job_id, status="running", progress=percent)
@@ -0,0 +1,424 @@
+import csv
+import io
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable
+
+import archive
+
+BASE_DIR = os.path.dirname(__file__)
+
+# Rows are pulled from SQLite in chunks of this size while exporting
+EXPORT_FETCH_SIZE = 500
+
+
+# --- Presentation utilities ---
+@lru_cache(maxsize=4096)
+def fmt_date_display(date_str: str | None) -> str:
+    """YYYY-MM-DD (DB format) → DD-MM-YYYY, memoised per distinct date."""
+    try:
+        if not date_str:
+            return ""
+        dt = datetime.strptime(date_str, "%Y-%m-%d")
+        return dt.strftime("%d-%m-%Y")
+    except Exception:
+        return date_str or ""
+
+
+# --- Filters ---
+def attendance_filters(department: str, start_date: str, end_date: str, search: str = ""):
+    """Build WHERE clauses shared by the query API and the exports."""
+    clauses = []
+    params = []
+    if department and department.lower() != "all":
+        # Any section whose name contains the text matches (so "II BCA (B)"
+        # also covers "II BCA (B)-CS"). The LIKE runs once against the small
+        # sections table; rows are then matched by indexed section_id.
+        clauses.append("section_id IN (SELECT id FROM sections WHERE LOWER(name) LIKE ?)")
+        params.append(f"%{department.lower()}%")
+    if start_date:
+        clauses.append("date >= ?")
+        params.append(start_date)
+    if end_date:
+        clauses.append("date <= ?")
+        params.append(end_date)
+    if search:
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("(barcode LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\' OR class LIKE ? ESCAPE '\\')")
+        like = f"%{escaped}%"
+        params.extend([like, like, like])
+    return clauses, params
+
+
+class ExportSpec:
+    """Parsed export filters plus the column layout they imply.
+
+    A single class or a single date is shown once in an info box, so the
+    matching column is left out of the table.
+    """
+
+    __slots__ = ("department", "start_date", "end_date", "is_single_class", "is_single_date")
+
+    def __init__(self, department: str = "", start_date: str = "", end_date: str = ""):
+        self.department = (department or "").strip()
+        self.start_date = (start_date or "").strip()
+        self.end_date = (end_date or "").strip()
+        self.is_single_class = bool(self.department and self.department.lower() != "all")
+        self.is_single_date = bool(self.start_date and self.start_date == self.end_date)
+
+    @classmethod
+    def from_args(cls, args) -> "ExportSpec":
+        return cls(args.get("department") or "", args.get("startDate") or "", args.get("endDate") or "")
+
+    def headers(self, in_label: str = "Walk-In Time", out_label: str = "Walk-Out Time", status_label: str = "Status"):
+        headers = ["Roll", "Name"]
+        if not self.is_single_class:
+            headers.append("Class")
+        if not self.is_single_date:
+            headers.append("Date")
+        headers.extend([in_label, out_label, status_label])
+        return headers
+
+    def info_lines(self):
+        lines = []
+        if self.is_single_class:
+            lines.append(f"Class: {self.department}")
+        if self.is_single_date:
+            lines.append(f"Date: {self.start_date}")
+        return lines
+
+    def _columns(self):
+        # SQL expressions rendering each visible column exactly as exported
+        cols = ["COALESCE(barcode, '')", "COALESCE(name, '')"]
+        if not self.is_single_class:
+            cols.append("COALESCE(class, '')")
+        if not self.is_single_date:
+            cols.append("COALESCE(date, '')")
+        cols.extend([
+            "COALESCE(in_time, '')",
+            "COALESCE(NULLIF(out_time, ''), '—')",
+            "COALESCE(status, '')",
+        ])
+        return cols
+
+    @property
+    def date_index(self) -> int | None:
+        if self.is_single_date:
+            return None
+        return 3 if not self.is_single_class else 2
+
+    def where(self):
+        clauses, params = attendance_filters(self.department, self.start_date, self.end_date)
+        where_sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return where_sql, params
+
+
+# --- Row pipeline ---
+def iter_row_batches(
+    conn: sqlite3.Connection,
+    spec: ExportSpec,
+    display_dates: bool = True,
+    fetch_size: int = EXPORT_FETCH_SIZE,
+    progress: Callable[[int], None] | None = None,
+):
+    """Yield lists of already-projected rows in id order, one fetch at a time.
+
+    Archived terms in the date range are read first, then the live table.
+    ``progress`` is called with the number of rows fetched so far.
+    """
+    where_sql, params = spec.where()
+    select = "SELECT " + ", ".join(spec._columns()) + " FROM {table}" + where_sql + " ORDER BY id ASC"
+    date_idx = spec.date_index if display_dates else None
+    done = 0
+    # Close each partition's cursor (and the partitions) even when the
+    # consumer abandons the stream, so the archive can be detached
+    with closing(archive.partitions(conn, spec.start_date, spec.end_date)) as tables:
+        for table in tables:
+            cur = conn.execute(select.format(table=table), params)
+            try:
+                while True:
+                    rows = cur.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    if progress:
+                        done += len(rows)
+                        progress(done)
+                    if date_idx is None:
+                        yield rows
+                        continue
+                    batch = []
+                    for r in rows:
+                        r = list(r)
+                        r[date_idx] = fmt_date_display(r[date_idx])
+                        batch.append(r)
+                    yield batch
+            finally:
+                cur.close()
+
+
+def count_rows(conn: sqlite3.Connection, spec: ExportSpec) -> int:
+    where_sql, params = spec.where()
+    total = 0
+    for table in archive.partitions(conn, spec.start_date, spec.end_date):
+        total += conn.execute(f"SELECT COUNT(*) FROM {table}" + where_sql, params).fetchall()[0][0]
+    return total
+
+
+def column_lengths(conn: sqlite3.Connection, spec: ExportSpec):
+    """Longest rendered value per visible column, one aggregate query per partition."""
+    where_sql, params = spec.where()
+    select = "SELECT " + ", ".join(f"MAX(LENGTH({c}))" for c in spec._columns()) + " FROM {table}" + where_sql
+    lengths = [0] * len(spec._columns())
+    for table in archive.partitions(conn, spec.start_date, spec.end_date):
+        row = conn.execute(select.format(table=table), params).fetchall()[0]
+        lengths = [max(a, n or 0) for a, n in zip(lengths, row)]
+    return lengths
+
+
+# --- Sinks ---
+def iter_csv(conn: sqlite3.Connection, spec: ExportSpec):
+    """Yield the CSV export as UTF-8 chunks (with BOM so Excel detects it)."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    output.write("\ufeff")
+    for line in spec.info_lines():
+        writer.writerow([line])
+    writer.writerow(spec.headers())
+    # CSV keeps the raw YYYY-MM-DD date so spreadsheets can sort it
+    for batch in iter_row_batches(conn, spec, display_dates=False):
+        writer.writerows(batch)
+        yield output.getvalue().encode("utf-8")
+        output.seek(0)
+        output.truncate(0)
+    yield output.getvalue().encode("utf-8")
+
+
+def write_xlsx(conn: sqlite3.Connection, spec: ExportSpec, path: str, progress: Callable[[int], None] | None = None):
+    """Stream rows into a write-only workbook saved at ``path``."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment
+    from openpyxl.utils import get_column_letter
+
+    headers = spec.headers()
+    total_cols = len(headers)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Attendance")
+    wrap = Alignment(wrap_text=True, vertical="top")
+    bold = Font(bold=True)
+
+    def cell(value, font=None, alignment=wrap):
+        c = WriteOnlyCell(ws, value=value)
+        c.alignment = alignment
+        if font:
+            c.font = font
+        return c
+
+    # Write-only sheets need column widths before the first row
+    for col_idx, (header, data_len) in enumerate(zip(headers, column_lengths(conn, spec)), start=1):
+        max_len = max(len(header), data_len)
+        width = max(12, min(60, int(max_len * 1.2)))
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+    # Standalone info box above the header (merged single cell with border and wrapping)
+    info_parts = spec.info_lines()
+    header_row = 2 if info_parts else 1
+    # Formatting: freeze header (write-only sheets take this before any row)
+    ws.freeze_panes = f"A{header_row + 1}"
+    if info_parts:
+        try:
+            from openpyxl.styles import Border, Side
+            thin = Side(style="thin")
+            box_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        except Exception:
+            box_border = None
+        info = cell("\n".join(info_parts), bold, Alignment(horizontal="center", vertical="center", wrap_text=True))
+        if box_border:
+            info.border = box_border
+        longest = max(len(p) for p in info_parts)
+        approx_lines = max(1, len(info_parts) + longest // 40)
+        ws.row_dimensions[1].height = 18 * approx_lines
+        ws.merged_cells.add(f"A1:{get_column_letter(total_cols)}1")
+        ws.append([info])
+
+    ws.append([cell(h, bold) for h in headers])
+    for batch in iter_row_batches(conn, spec, progress=progress):
+        for row in batch:
+            ws.append([cell(v) for v in row])
+
+    wb.save(path)
+    # Safety check: XLSX should be a ZIP file starting with 'PK' signature
+    with open(path, "rb") as f:
+        if f.read(2) != b"PK":
+            raise RuntimeError("Generated XLSX failed integrity check; falling back to CSV")
+
+
+# --- PDF ---
+PDF_FONT = "Helvetica"
+PDF_FONT_BOLD = "Helvetica-Bold"
+PDF_FONT_SIZE = 9
+
+
+@lru_cache(maxsize=8192)
+def fit_text(text: str, max_width: float, font: str = PDF_FONT, size: int = PDF_FONT_SIZE) -> str:
+    """Clip ``text`` with an ellipsis so it fits ``max_width`` points."""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    if stringWidth(text, font, size) <= max_width:
+        return text
+    budget = max_width - stringWidth("…", font, size)
+    width = 0.0
+    for i, ch in enumerate(text):
+        width += stringWidth(ch, font, size)
+        if width > budget:
+            return text[:i] + "…"
+    return text
+
+
+def write_pdf(conn: sqlite3.Connection, spec: ExportSpec, out, progress: Callable[[int], None] | None = None):
+    """Render the attendance report as PDF into the file-like ``out``.
+
+    The letterhead and the repeated page header are drawn once as form
+    XObjects and referenced from every page. Each page's rows go out as
+    one path for the grid lines plus one text object, filled a column at
+    a time so the cursor only moves once per column.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import cm
+
+    c = canvas.Canvas(out, pagesize=A4)
+    width, height = A4
+
+    # Margins
+    left_margin = 1.5*cm
+    right_margin = 1.5*cm
+    bottom_margin = 2*cm
+    usable_width = width - left_margin - right_margin
+    x0 = left_margin
+    row_height = 0.65*cm
+
+    # Header with logo + college title, drawn once into a form
+    logo_path = os.path.join(BASE_DIR, "static", "logo.jpg")
+    top_y = height - 1.2*cm
+    logo_w = 1.8*cm
+    logo_h = 1.8*cm
+    line_y = top_y - logo_h - 0.25*cm
+    header_bottom = line_y - 1.1*cm
+
+    c.beginForm("letterhead")
+    has_logo = os.path.exists(logo_path)
+    if has_logo:
+        try:
+            c.drawImage(logo_path, left_margin, top_y - logo_h, width=logo_w, height=logo_h, preserveAspectRatio=True, mask='auto')
+        except Exception:
+            has_logo = False
+    text_x = left_margin + (logo_w if has_logo else 0) + 0.5*cm
+    # Title
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(text_x, top_y - 0.2*cm, "Dr. B. B. Hegde First Grade College, Kundapura")
+    # Subtitle
+    c.setFont("Helvetica", 10)
+    c.drawString(text_x, top_y - 0.2*cm - 0.7*cm, "A Unit of Coondapur Education Society (R)")
+    # underline
+    c.setLineWidth(0.5)
+    c.line(left_margin, line_y, width - right_margin, line_y)
+    # Optional report title below (centered)
+    c.setFont("Helvetica-Bold", 12)
+    c.drawCentredString(width / 2, line_y - 0.9*cm, "Library Attendance Report")
+    c.endForm()
+
+    headers = spec.headers("In", "Out")
+
+    # Compute column widths now that we know which headers are present
+    if not spec.is_single_class and not spec.is_single_date:
+        #            Roll  Name  Class Date  In   Out  Status
+        col_widths_cm = [3.0, 7.0, 4.8, 3.0, 2.5, 2.5, 3.0]
+    elif spec.is_single_class and not spec.is_single_date:
+        col_widths_cm = [3.0, 8.5, 3.5, 2.5, 2.5, 3.0]  # no Class column
+    elif not spec.is_single_class and spec.is_single_date:
+        col_widths_cm = [3.0, 8.5, 4.8, 2.5, 2.5, 3.0]  # no Date column, wider Class
+    else:
+        col_widths_cm = [3.0, 10.0, 2.8, 2.8, 3.0]  # no Class, no Date
+    col_widths = [w*cm for w in col_widths_cm]
+    total_cols_width = sum(col_widths)
+    if total_cols_width > usable_width:
+        scale = usable_width / total_cols_width
+        col_widths = [w*scale for w in col_widths]
+        total_cols_width = sum(col_widths)
+    col_x = [x0]
+    for cw in col_widths:
+        col_x.append(col_x[-1] + cw)
+    x1 = col_x[-1]
+    # Text is clipped to the cell minus 2pt padding on each side
+    text_widths = [cw - 4 for cw in col_widths]
+
+    def draw_rows(rows, top, line_width=0.5, font=PDF_FONT):
+        """Grid and text for consecutive rows starting at ``top``; returns the new top."""
+        bottom = top - row_height * len(rows)
+        c.setLineWidth(line_width)
+        p = c.beginPath()
+        for k in range(len(rows) + 1):
+            p.moveTo(x0, top - k*row_height)
+            p.lineTo(x1, top - k*row_height)
+        for x in col_x:
+            p.moveTo(x, bottom)
+            p.lineTo(x, top)
+        c.drawPath(p, stroke=1, fill=0)
+        # Text goes down one column at a time, a line per row
+        t = c.beginText()
+        t.setFont(font, PDF_FONT_SIZE, row_height)
+        for i, (x, tw) in enumerate(zip(col_x, text_widths)):
+            column = [fit_text(str(r[i]) if i < len(r) and r[i] else "", tw, font) for r in rows]
+            if any(column):
+                t.setTextOrigin(x + 2, top - row_height + 2)
+                t.textLines(column, trim=0)
+        c.drawText(t)
+        return bottom
+
+    # Continuation pages: letterhead, info lines as rows, then column headers
+    info_lines = spec.info_lines()
+    c.beginForm("page_header")
+    c.doForm("letterhead")
+    y = header_bottom
+    if info_lines:
+        y = draw_rows([[line] for line in info_lines], y)
+    continued_top = draw_rows([headers], y, line_width=1, font=PDF_FONT_BOLD)
+    c.endForm()
+
+    # First page: letterhead, optional info box (separate bordered rectangle)
+    c.doForm("letterhead")
+    y = header_bottom
+    if info_lines:
+        box_height = max(1.0*cm, 0.6*cm * len(info_lines) + 0.4*cm)
+        c.setLineWidth(0.8)
+        c.rect(x0, y - box_height, total_cols_width, box_height, stroke=1, fill=0)
+        c.setFont("Helvetica-Bold", 10)
+        text_y = y - 0.35*cm
+        for line in info_lines:
+            c.drawString(x0 + 0.2*cm, text_y, line)
+            text_y -= 0.6*cm
+        y -= (box_height + 0.25*cm)
+    y = draw_rows([headers], y, line_width=1, font=PDF_FONT_BOLD)
+
+    page_rows = []
+    capacity = int((y - bottom_margin) // row_height)
+    for batch in iter_row_batches(conn, spec, progress=progress):
+        for row in batch:
+            if len(page_rows) >= capacity:
+                draw_rows(page_rows, y)
+                c.showPage()
+                c.doForm("page_header")
+                y = continued_top
+                page_rows = []
+                capacity = int((y - bottom_margin) // row_height)
+            page_rows.append(row)
+    if page_rows:
+        draw_rows(page_rows, y)
+
+    c.showPage()
+    c.save()
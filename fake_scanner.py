@@ -0,0 +1,129 @@
+import os
+import random
+import threading
+import time
+
+import usb.core
+
+# Simulated scanners speak the same boot-keyboard HID reports as the real ones
+import both_test as scanner
+from roster import Roster
+
+ENTER_KEY = 40
+LEFT_SHIFT = 0x02
+# Characters a roster barcode may contain -> (keycode, modifier)
+_KEYS = {ch: (code, 0) for code, ch in scanner.KEYMAP.items()}
+_KEYS.update({ch: (code, LEFT_SHIFT) for code, ch in scanner.SHIFT_KEYMAP.items()})
+_RELEASE = bytes(8)
+
+
+def encode_barcode(code: str) -> list[bytes]:
+    """HID reports that type ``code`` followed by Enter, with key releases."""
+    reports = []
+    for ch in code:
+        key, mod = _KEYS[ch]
+        reports.append(bytes([mod, 0, key, 0, 0, 0, 0, 0]))
+        reports.append(_RELEASE)
+    reports.append(bytes([0, 0, ENTER_KEY, 0, 0, 0, 0, 0]))
+    reports.append(_RELEASE)
+    return reports
+
+
+def roster_barcodes(base_dir: str | None = None) -> list[str]:
+    """Every barcode in student_data/ (and the legacy roster files)."""
+    roster = Roster(base_dir or os.path.dirname(os.path.abspath(__file__)))
+    roster.load()
+    return [b for b in roster.barcodes() if all(ch in _KEYS for ch in b)]
+
+
+class _Endpoint:
+    bEndpointAddress = 0x81
+    wMaxPacketSize = 8
+    bLength = 7
+    bDescriptorType = 5
+
+
+class FakeScanner:
+    """A pyusb-like device that types scripted barcodes.
+
+    Codes come from ``script`` (any iterable of strings) at ``rate`` scans
+    per minute, one report per read like a real scanner. ``scanned``
+    records (code, time the Enter report was read) for latency checks.
+    """
+
+    def __init__(self, vendor: int, product: int, script, rate: float = 200, jitter: float = 0.0):
+        self.idVendor = vendor
+        self.idProduct = product
+        self.interval = 60.0 / rate if rate > 0 else 0.0
+        self.jitter = jitter
+        self.connected = True
+        self.scanned: list[tuple[str, float]] = []
+        self._script = iter(script)
+        self._reports: list[bytes] = []
+        self._code = None
+        self._next_scan = time.monotonic()
+        self._lock = threading.Lock()
+        self._endpoint = _Endpoint()
+
+    # --- pyusb surface used by both_test.open_scanner ---
+    def set_configuration(self):
+        pass
+
+    def get_active_configuration(self):
+        return {(0, 0): [self._endpoint]}
+
+    def read(self, address, size, timeout=None):
+        if not self.connected:
+            raise usb.core.USBError("No such device", errno=19)
+        with self._lock:
+            if not self._reports:
+                now = time.monotonic()
+                wait = self._next_scan - now
+                if wait > 0:
+                    time.sleep(min(wait, (timeout or 1000) / 1000))
+                    if time.monotonic() < self._next_scan:
+                        raise usb.core.USBError("Operation timed out", errno=110)
+                self._code = next(self._script, None)
+                if self._code is None:
+                    time.sleep((timeout or 1000) / 1000)
+                    raise usb.core.USBError("Operation timed out", errno=110)
+                self._reports = encode_barcode(self._code)
+                spread = self.interval * self.jitter
+                self._next_scan = max(now, self._next_scan) + self.interval + random.uniform(-spread, spread)
+            report = self._reports.pop(0)
+            if report[2] == ENTER_KEY:
+                self.scanned.append((self._code, time.monotonic()))
+            return report
+
+    # --- test controls ---
+    def unplug(self):
+        self.connected = False
+
+    def plug(self):
+        self.connected = True
+
+
+class FakeBus:
+    """Stands in for usb.core.find: ``both_test.device_source = bus.find``."""
+
+    def __init__(self, devices=()):
+        self.devices = list(devices)
+
+    def find(self, vendor: int, product: int):
+        for dev in self.devices:
+            if dev.idVendor == vendor and dev.idProduct == product and dev.connected:
+                return dev
+        return None
+
+    def install(self):
+        scanner.device_source = self.find
+        return self
+
+
+def random_script(barcodes: list[str], count: int | None = None, seed: int | None = None):
+    """Yield ``count`` random barcodes (forever if None)."""
+    rng = random.Random(seed)
+    n = 0
+    while count is None or n < count:
+        yield rng.choice(barcodes)
+        n += 1
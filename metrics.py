@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+# Off: every hook below is a single flag check
+ENABLED = False
+# Scans slower than this end to end are printed with a per-stage breakdown (0 = never)
+SLOW_SCAN_MS = 0
+# Latency buckets in seconds (Prometheus histogram "le" bounds)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Recent samples per stage used for the rolling p50/p99 gauges
+RECENT_SAMPLES = 1024
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count", "recent")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds: float):
+        i = 0
+        for bound in BUCKETS:
+            if seconds <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        recent = sorted(self.recent)
+        if not recent:
+            return 0.0
+        return recent[min(len(recent) - 1, int(q * len(recent)))]
+
+
+_histograms: dict[str, Histogram] = {}
+_gauges: dict[str, tuple[str, str | None, Callable[[], float | dict]]] = {}
+_lock = threading.Lock()
+
+
+def configure(enabled: bool, slow_scan_ms: float = 0):
+    global ENABLED, SLOW_SCAN_MS
+    ENABLED = enabled
+    SLOW_SCAN_MS = slow_scan_ms
+
+
+def observe(stage: str, seconds: float):
+    """Record one latency sample for ``stage`` (callers check ENABLED first)."""
+    with _lock:
+        h = _histograms.get(stage)
+        if h is None:
+            h = _histograms[stage] = Histogram()
+        h.observe(seconds)
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timer(stage: str):
+    """``with metrics.timer("db_write"):`` times the block when enabled."""
+    return _Timer(stage) if ENABLED else _NO_TIMER
+
+
+class ScanTrace:
+    """Stage-by-stage timing of one scan; ``mark`` closes the current stage."""
+
+    __slots__ = ("barcode", "start", "last", "stages")
+
+    def __init__(self, barcode: str):
+        self.barcode = barcode
+        self.start = self.last = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        seconds = now - self.last
+        self.last = now
+        self.stages.append((stage, seconds))
+        observe(stage, seconds)
+
+    def finish(self):
+        total = self.last - self.start
+        observe("scan_total", total)
+        if SLOW_SCAN_MS and total * 1000 >= SLOW_SCAN_MS:
+            detail = ", ".join(f"{s}={t * 1000:.1f}ms" for s, t in self.stages)
+            print(f"Slow scan {self.barcode}: {total * 1000:.1f}ms ({detail})")
+
+
+def start_scan(barcode: str) -> ScanTrace | None:
+    return ScanTrace(barcode) if ENABLED else None
+
+
+def gauge(name: str, help_text: str, fn: Callable[[], float | dict], label: str | None = None):
+    """Register a value read at scrape time.
+
+    With ``label``, ``fn`` returns {label value: value}, one series each.
+    """
+    _gauges[name] = (help_text, label, fn)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, (help_text, label, fn) in _gauges.items():
+        try:
+            value = fn()
+        except Exception as e:
+            print(f"Metric {name} failed: {e}")
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        if label:
+            for key, v in value.items():
+                lines.append(f'{name}{{{label}="{key}"}} {v}')
+        else:
+            lines.append(f"{name} {value}")
+
+    with _lock:
+        snapshot = {stage: (list(h.counts), h.total, h.count, h.quantile(0.5), h.quantile(0.99)) for stage, h in _histograms.items()}
+
+    lines.append("# HELP attendance_stage_seconds Time spent per scan pipeline stage")
+    lines.append("# TYPE attendance_stage_seconds histogram")
+    for stage, (counts, total, count, _, _) in snapshot.items():
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f'attendance_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'attendance_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'attendance_stage_seconds_sum{{stage="{stage}"}} {total}')
+        lines.append(f'attendance_stage_seconds_count{{stage="{stage}"}} {count}')
+
+    lines.append(f"# HELP attendance_stage_recent_seconds Stage latency over the last {RECENT_SAMPLES} samples")
+    lines.append("# TYPE attendance_stage_recent_seconds gauge")
+    for stage, (_, _, _, p50, p99) in snapshot.items():
+        lines.append(f'attendance_stage_recent_seconds{{stage="{stage}",quantile="0.5"}} {p50}')
+        lines.append(f'attendance_stage_recent_seconds{{stage="{stage}",quantile="0.99"}} {p99}')
+    return "\n".join(lines) + "\n"
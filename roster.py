@@ -0,0 +1,197 @@
+import hashlib
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+
+# Roster files considered besides every student_data/*.json
+LEGACY_FILES = ("final_year.json", "second_year.json")
+# How often the watcher checks roster files for changes
+RELOAD_CHECK_SECONDS = 5
+# Prebuilt roster snapshot, reused while the source files are unchanged
+CACHE_FILE = ".roster_cache"
+CACHE_FORMAT = 1
+
+
+class Student:
+    """One roster entry with fields already stripped; section is interned."""
+
+    __slots__ = ("name", "section")
+
+    def __init__(self, name, section):
+        self.name = name
+        self.section = section
+
+    def __repr__(self):
+        return f"Student({self.name!r}, {self.section!r})"
+
+
+def _first(raw: dict, *keys) -> str:
+    for k in keys:
+        v = raw.get(k)
+        if v:
+            return str(v).strip()
+    return ""
+
+
+def normalize_student(raw: dict) -> Student:
+    name = _first(raw, "name", "student_name", "fullName", "studentName")
+    section = _first(raw, "section", "class", "dept")
+    return Student(name or None, sys.intern(section) if section else None)
+
+
+def parse_roster_file(path: str, out: dict):
+    """Add the students in one roster JSON file to ``out`` (ROLL -> Student)."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and "students" in data and isinstance(data["students"], list):
+        for s in data["students"]:
+            roll = str(s.get("roll") or s.get("roll_no") or s.get("id") or "").strip()
+            if roll:
+                out[roll.upper()] = normalize_student(s)
+    elif isinstance(data, dict):
+        for k, v in data.items():
+            roll = str(k).strip()
+            if roll:
+                out[roll.upper()] = normalize_student(v if isinstance(v, dict) else {})
+
+
+def _sha1(path: str) -> str | None:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class Roster:
+    """Barcode -> Student lookup, reloaded when the roster files change.
+
+    A reload builds a complete new mapping and swaps it in with a single
+    assignment, so lookups never wait on (or see half of) a reload.
+    """
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self._students: dict[str, Student] = {}
+        self._stamp = None
+        self._watcher = None
+
+    def sources(self) -> list[str]:
+        paths = []
+        student_dir = os.path.join(self.base_dir, "student_data")
+        if os.path.isdir(student_dir):
+            for fname in sorted(os.listdir(student_dir)):
+                if fname.lower().endswith(".json"):
+                    paths.append(os.path.join(student_dir, fname))
+        for legacy in LEGACY_FILES:
+            legacy_path = os.path.join(self.base_dir, legacy)
+            if os.path.exists(legacy_path):
+                paths.append(legacy_path)
+        return paths
+
+    def _stat(self, paths: list[str]) -> tuple:
+        stamp = []
+        for p in paths:
+            try:
+                st = os.stat(p)
+                stamp.append((p, st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append((p, None, None))
+        return tuple(stamp)
+
+    def load(self):
+        paths = self.sources()
+        stamp = self._stat(paths)
+        students = self._load_cache(stamp)
+        if students is None:
+            students = {}
+            for path in paths:
+                try:
+                    parse_roster_file(path, students)
+                except Exception as e:
+                    print(f"Failed to load students from {path}: {e}")
+            self._save_cache(stamp, students)
+        self._students = students
+        self._stamp = stamp
+
+    # --- Snapshot cache ---
+    # marshal of parallel arrays (rolls, names, section index) plus a section
+    # table, keyed by each source's path, mtime, size and SHA-1.
+    def _cache_path(self) -> str:
+        return os.path.join(self.base_dir, CACHE_FILE)
+
+    def _load_cache(self, stamp: tuple) -> dict | None:
+        try:
+            with open(self._cache_path(), "rb") as f:
+                snap = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(snap, dict) or snap.get("format") != CACHE_FORMAT:
+            return None
+        cached = snap["sources"]
+        if [s[:3] for s in cached] != list(stamp):
+            # Files were touched; still reuse the snapshot if contents match
+            if [s[0] for s in cached] != [p for p, _, _ in stamp]:
+                return None
+            if any(s[3] != _sha1(s[0]) for s in cached):
+                return None
+            self._save_cache(stamp, None, snap)
+        sections = [sys.intern(x) if x is not None else None for x in snap["sections"]]
+        students = map(Student, snap["names"], [sections[i] for i in snap["section_idx"]])
+        return dict(zip(snap["rolls"], students))
+
+    def _save_cache(self, stamp: tuple, students: dict | None, snap: dict | None = None):
+        if snap is None:
+            section_idx: dict = {None: 0}
+            snap = {
+                "format": CACHE_FORMAT,
+                "rolls": list(students),
+                "names": [s.name for s in students.values()],
+                "section_idx": [section_idx.setdefault(s.section, len(section_idx)) for s in students.values()],
+            }
+            snap["sections"] = list(section_idx)
+        try:
+            snap["sources"] = [(p, m, n, _sha1(p)) for p, m, n in stamp]
+            tmp = self._cache_path() + ".tmp"
+            with open(tmp, "wb") as f:
+                marshal.dump(snap, f)
+            os.replace(tmp, self._cache_path())
+        except (OSError, ValueError) as e:
+            print(f"Could not write roster cache: {e}")
+
+    def reload_if_changed(self) -> bool:
+        if self._stat(self.sources()) == self._stamp:
+            return False
+        self.load()
+        print(f"Roster reloaded: {len(self._students)} students")
+        return True
+
+    def start_watcher(self, interval: float = RELOAD_CHECK_SECONDS):
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"Roster reload failed: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="roster-watch", daemon=True)
+        self._watcher.start()
+
+    def get(self, barcode: str) -> Student | None:
+        return self._students.get(barcode.upper())
+
+    def barcodes(self) -> list[str]:
+        return list(self._students)
+
+    def sections(self) -> set[str]:
+        return {s.section for s in self._students.values() if s.section}
+
+    def __len__(self):
+        return len(self._students)
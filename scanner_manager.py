@@ -0,0 +1,97 @@
+import threading
+import time
+from typing import Callable
+
+# Device access, decoding and the scan queue live in both_test.py
+import both_test as scanner
+
+
+class ScannerManager:
+    """Keep a reader running for every configured scanner that is plugged in.
+
+    Devices are looked up every ``poll_interval`` seconds, so a scanner
+    that is connected later (or reconnected) is picked up without a
+    restart. Readers that die are restarted with exponential backoff.
+    Every scanner feeds the shared queue, tagged with its prefix as the
+    gate id.
+    """
+
+    def __init__(self, scanners=None, poll_interval=2.0, min_backoff=1.0, max_backoff=30.0):
+        self.scanners = scanners if scanners is not None else scanner.SCANNERS
+        self.poll_interval = poll_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._readers = {}  # prefix -> reader thread
+        self._backoff = {}
+        self._next_attempt = {}
+        self._restarts = {}
+        self._seen = set()  # gates that have had a reader at least once
+        self._stop = threading.Event()
+
+    def run(self, callback: Callable[[str, str], None]):
+        """Dispatch scans to callback(code, gate) and watch devices until stopped."""
+        scanner.stop_flag = False
+        scanner.active_scanner = None  # every gate feeds events
+        self._stop.clear()
+        dispatcher = threading.Thread(
+            target=scanner.dispatch_scans, args=(callback, True), name="scan-dispatch", daemon=True
+        )
+        dispatcher.start()
+        print(f"✅ Watching {len(self.scanners)} scanner(s): " + ", ".join(s["prefix"] for s in self.scanners))
+        while not self._stop.is_set() and not scanner.stop_flag:
+            self._check(time.monotonic())
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+        scanner.stop_flag = True
+
+    def status(self):
+        """Per-gate connection state and restart counts."""
+        return {
+            s["prefix"]: {
+                "connected": bool(self._readers.get(s["prefix"]) and self._readers[s["prefix"]].is_alive()),
+                "restarts": self._restarts.get(s["prefix"], 0),
+            }
+            for s in self.scanners
+        }
+
+    def _check(self, now: float):
+        for cfg in self.scanners:
+            prefix = cfg["prefix"]
+            reader = self._readers.get(prefix)
+            if reader is not None:
+                if reader.is_alive():
+                    continue
+                # Reader exited (unplugged or USB error): retry after a backoff
+                del self._readers[prefix]
+                if now - reader.started_at > self.max_backoff:
+                    self._backoff[prefix] = self.min_backoff
+                self._schedule_retry(prefix, now)
+                continue
+
+            if now < self._next_attempt.get(prefix, 0):
+                continue
+            # Cheap presence check first so absent scanners stay quiet
+            if scanner.find_device(cfg["vendor"], cfg["product"]) is None:
+                continue
+            opened = scanner.open_scanner(cfg["vendor"], cfg["product"], prefix)
+            if opened is None:
+                self._schedule_retry(prefix, now)
+                continue
+
+            t = threading.Thread(
+                target=scanner.read_device, args=(*opened, prefix), name=f"scanner-{prefix}", daemon=True
+            )
+            t.started_at = now
+            t.start()
+            self._readers[prefix] = t
+            if prefix in self._seen:
+                self._restarts[prefix] = self._restarts.get(prefix, 0) + 1
+            self._seen.add(prefix)
+
+    def _schedule_retry(self, prefix: str, now: float):
+        delay = self._backoff.get(prefix, self.min_backoff)
+        self._next_attempt[prefix] = now + delay
+        self._backoff[prefix] = min(delay * 2, self.max_backoff)
+        print(f"{prefix}: reconnecting in {delay:g}s")
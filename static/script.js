@@ -44,10 +44,12 @@ document.addEventListener('DOMContentLoaded', () => {
   socket.on('connect', () => {
     console.log('Connected');
   });
-  socket.on('barcode_scanned', (payload) => {
-    const { barcode, record } = payload;
-    updateLastScan(barcode, record?.action || 'Scanned');
-    // refresh table quickly
+  socket.on('scans_batch', (frame) => {
+    const scans = frame?.scans || [];
+    if (!scans.length) return;
+    const last = scans[scans.length - 1];
+    updateLastScan(last.roll_no, last.action || 'Scanned');
+    // refresh table once per batch
     loadAttendance();
   });
 });
@@ -0,0 +1,24 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """app, initialised against a copy of attendance.db in tmp_path."""
+    path = tmp_path / "attendance.db"
+    shutil.copy(os.path.join(REPO, "attendance.db"), path)
+    monkeypatch.setattr(db, "DB_PATH", str(path))
+    import app
+
+    app.roster.load()
+    app.init_db()
+    yield app
+    db.close_connection()
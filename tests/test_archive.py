@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import db
+from exports import EXPORT_FETCH_SIZE, ExportSpec, count_rows, iter_csv
+
+
+def _archive_old_visits(app, count=1):
+    conn = db.get_connection()
+    section_id = app._section_id(conn, "III BBA")
+    with conn:
+        conn.executemany(
+            "INSERT INTO attendance (barcode, name, section, section_id, class, date, in_time, out_time, status, version) "
+            "VALUES (?, 'Old Student', 'III BBA', ?, 'III BBA', '2024-02-03', '10:00:00', '11:00:00', 'Completed', 0)",
+            [(f"OLD{i}", section_id) for i in range(count)],
+        )
+    assert app.run_maintenance()["archived"]["2024-1"] == count
+    return conn
+
+
+def _attached(conn):
+    return [row[1] for row in conn.execute("PRAGMA database_list") if row[1].startswith("archive_")]
+
+
+def test_abandoned_export_stream_does_not_leak_attaches(app_module):
+    # More rows than one fetch, so a stream stops with its cursor mid-read
+    conn = _archive_old_visits(app_module, EXPORT_FETCH_SIZE + 1)
+    spec = ExportSpec("", "2024-01-01", "2024-12-31")
+    # More failed streams than SQLite's limit of 10 attached databases
+    errors = []
+    for _ in range(12):
+        stream = iter_csv(conn, spec)
+        next(stream)
+        try:
+            stream.throw(ConnectionError("client went away"))
+        except ConnectionError as e:
+            errors.append(e)  # the traceback keeps the generator frames alive
+    assert _attached(conn) == []
+    assert count_rows(conn, spec) == EXPORT_FETCH_SIZE + 1
+
+
+def test_clear_keeps_archived_terms(app_module):
+    _archive_old_visits(app_module, 3)
+    app_module._debouncer.window = 0
+    app_module.on_barcode(app_module.roster.barcodes()[0])
+    client = app_module.app.test_client()
+
+    assert client.delete("/api/clear_attendance").get_json()["success"]
+    assert db.get_connection().execute("SELECT COUNT(*) FROM attendance").fetchone()[0] == 0
+    rows = client.get("/api/attendance/query?limit=500").get_json()["attendance"]
+    assert [r["barcode"] for r in rows if r["date"] == "2024-02-03"] == ["OLD2", "OLD1", "OLD0"]
+    assert not any(r["date"] == datetime.now().strftime("%Y-%m-%d") for r in rows)
@@ -0,0 +1,42 @@
+import threading
+import time
+
+import both_test as scanner
+import fake_scanner
+
+
+def test_cooperative_listener_delivers_every_scanner_with_its_gate(monkeypatch):
+    configs = scanner.SCANNERS[:2]
+    devices = [
+        fake_scanner.FakeScanner(s["vendor"], s["product"], [f"GATE{i}CODE{n}" for n in range(3)], rate=6000)
+        for i, s in enumerate(configs)
+    ]
+    monkeypatch.setattr(scanner, "SCANNERS", configs)
+    monkeypatch.setattr(scanner, "device_source", fake_scanner.FakeBus(devices).find)
+    monkeypatch.setattr(scanner, "stop_flag", False)
+
+    received = []
+    reads = []
+
+    def blocking(fn, *args, **kwargs):
+        reads.append(fn)
+        return fn(*args, **kwargs)
+
+    listener = threading.Thread(
+        target=scanner.cooperative_listener,
+        args=(lambda code, gate: received.append((code, gate)),),
+        kwargs={"with_gate": True, "blocking": blocking},
+        daemon=True,
+    )
+    listener.start()
+    deadline = time.monotonic() + 10
+    while len(received) < 6 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    scanner.stop_flag = True
+    listener.join(5)
+
+    assert scanner.active_scanner is None
+    assert sorted(received) == sorted(
+        (f"GATE{i}CODE{n}", s["prefix"]) for i, s in enumerate(configs) for n in range(3)
+    )
+    assert reads  # every USB read went through the offload hook
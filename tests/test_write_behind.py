@@ -0,0 +1,57 @@
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Queues scans behind a flush interval far longer than the test, then waits
+CHILD = textwrap.dedent("""
+    import sys, time
+    sys.path.insert(0, sys.argv[1])
+    import db
+    db.DB_PATH = sys.argv[2]
+    import app
+    app.WRITE_BEHIND_ENABLED = True
+    app.WRITE_BEHIND_FLUSH_MS = 600_000
+    app.roster.load()
+    app.init_db()
+    app.start_write_behind()
+    app.install_shutdown_handlers()
+    app._debouncer.window = 0
+    for barcode in app.roster.barcodes()[:10]:
+        app.on_barcode(barcode)
+    print(app._write_behind.pending(), app._committed_version, flush=True)
+    time.sleep(60)
+""")
+
+
+def test_sigterm_saves_queued_writes(tmp_path):
+    path = tmp_path / "attendance.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE attendance (id INTEGER PRIMARY KEY AUTOINCREMENT, barcode TEXT, name TEXT, class TEXT, date TEXT, in_time TEXT, out_time TEXT, status TEXT)")
+    conn.close()
+
+    child = subprocess.Popen(
+        [sys.executable, "-c", CHILD, REPO, str(path)],
+        stdout=subprocess.PIPE, text=True, cwd=REPO,
+    )
+    try:
+        while True:
+            line = child.stdout.readline()
+            assert line, "child exited before queueing scans"
+            if line[0].isdigit():
+                break
+        pending, committed = map(int, line.split())
+        assert pending > 0
+        assert committed == 0  # nothing has reached SQLite yet
+        child.send_signal(signal.SIGTERM)
+        assert child.wait(timeout=20) == 0
+    finally:
+        child.kill()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM attendance WHERE status = 'In Library'").fetchone()[0] == 10
+    conn.close()
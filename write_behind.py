@@ -0,0 +1,130 @@
+import queue
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+import db
+import metrics
+
+
+class WriteBehindQueue:
+    """Group-commit attendance writes from a single background thread.
+
+    Statements are queued with the change version they carry. The writer
+    commits whatever is pending every ``flush_interval_ms`` or once
+    ``max_batch`` statements are waiting, then reports the highest
+    committed version through ``on_commit``.
+
+    A batch that fails to commit is retried until it succeeds: the scans
+    in it have already been decided and broadcast, so dropping them would
+    leave rows that exist on every dashboard but not in SQLite. While it
+    fails, ``error`` holds the last exception and ``flush`` waits.
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: int = 50,
+        max_batch: int = 200,
+        on_commit: Callable[[int], None] | None = None,
+        max_backoff: float = 5.0,
+    ):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.on_commit = on_commit
+        self.max_backoff = max_backoff
+        self.error: Exception | None = None  # set while commits are failing
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, sql: str, params: tuple, version: int):
+        self._queue.put((sql, params, version))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until everything submitted so far is committed.
+
+        Returns False if ``timeout`` passed first (e.g. SQLite is failing).
+        """
+        if not self._thread or not self._thread.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout: float | None = 10):
+        """Flush pending writes and stop the writer thread."""
+        if not self._thread:
+            return
+        if not self.flush(timeout):
+            print(f"Write-behind stopped with {self.pending()} attendance writes unsaved: {self.error}")
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                if self._stopping:
+                    return
+                continue
+            batch = []
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+            while item is not None:
+                if isinstance(item, threading.Event):
+                    # A flush request: commit what we have now
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Stop request: commit this batch first, then exit
+                    self._queue.put(None)
+                    break
+
+            if batch:
+                self._commit(batch)
+            for w in waiters:
+                w.set()
+
+    def _commit(self, batch: list):
+        attempt = 0
+        while True:
+            attempt += 1
+            conn = db.get_connection()
+            try:
+                with metrics.timer("db_group_commit"), conn:
+                    for sql, params, _ in batch:
+                        conn.execute(sql, params)
+                break
+            except sqlite3.Error as e:
+                self.error = e
+                if attempt == 1 or attempt % 10 == 0:
+                    print(f"Write-behind commit of {len(batch)} attendance writes failed (attempt {attempt}), retrying: {e}")
+                time.sleep(min(self.max_backoff, 0.1 * attempt))
+        if self.error is not None:
+            print(f"Write-behind commit succeeded after {attempt} attempts")
+            self.error = None
+        if self.on_commit:
+            self.on_commit(max(version for _, _, version in batch))